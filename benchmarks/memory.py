@@ -0,0 +1,127 @@
+"""Measures the memory retained per node with tracemalloc, for nodes that are built and for nodes that are loaded.
+
+Pass the directory of another cast.py to measure that version instead, for example an older checkout."""
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+if len(sys.argv) > 1:
+    sys.path.insert(0, os.path.abspath(sys.argv[1]))
+else:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "libraries", "python"))
+
+import cast
+
+
+def bareInstances(count):
+    """Builds a root with the given number of instances without properties."""
+    root = cast.Root()
+
+    for i in range(count):
+        root.CreateInstance()
+
+    return root
+
+
+def instances(count):
+    """Builds a root with the given number of named instances with a transform."""
+    root = cast.Root()
+
+    for i in range(count):
+        instance = root.CreateInstance()
+        instance.SetName("instance%d" % i)
+        instance.SetPosition((float(i), 0.0, 0.0))
+        instance.SetRotation((0.0, 0.0, 0.0, 1.0))
+        instance.SetScale((1.0, 1.0, 1.0))
+
+    return root
+
+
+def curves(count):
+    """Builds a root with an animation of the given number of curves, with a few keyframes each."""
+    root = cast.Root()
+    animation = root.CreateAnimation()
+
+    for i in range(count):
+        curve = animation.CreateCurve()
+        curve.SetNodeName("bone%d" % (i % 1000))
+        curve.SetKeyPropertyName("rq")
+        curve.SetKeyFrameBuffer([0, 10, 20, 30])
+        curve.SetVec4KeyValueBuffer([(0.0, 0.0, 0.0, 1.0)] * 4)
+        curve.SetMode("absolute")
+
+    return root
+
+
+def measure(function, *args):
+    """Returns the bytes retained by the result of the given function."""
+    gc.collect()
+    tracemalloc.start()
+
+    result = function(*args)
+
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del result
+    return size
+
+
+def load(path, read):
+    """Loads the cast file at the given path, and when read is set reads the properties of each node through its accessors."""
+    file = cast.Cast.load(path)
+    nodes = list(file.rootNodes)
+
+    if not read:
+        return file
+
+    while nodes:
+        node = nodes.pop()
+
+        if isinstance(node, cast.Instance):
+            node.Name()
+            node.Position()
+        elif isinstance(node, cast.Curve):
+            node.NodeName()
+            node.KeyValueBuffer()
+
+        nodes.extend(node.childNodes)
+
+    return file
+
+
+def main():
+    print("bytes retained per node")
+
+    for name, build, count in (("bare Instance", bareInstances, 500000),
+                               ("Instance", instances, 500000),
+                               ("Curve", curves, 100000)):
+        print("%-30s %6d" % ("%dk %s (built)" % (count // 1000, name),
+                             measure(build, count) // count))
+
+        if build is bareInstances:
+            continue
+
+        file = cast.Cast()
+        file.rootNodes.append(build(count))
+
+        descriptor, path = tempfile.mkstemp(".cast")
+        os.close(descriptor)
+
+        try:
+            file.save(path)
+            del file
+
+            print("%-30s %6d" % ("%dk %s (loaded)" % (count // 1000, name),
+                                 measure(load, path, False) // count))
+            print("%-30s %6d" % ("%dk %s (loaded, read)" % (count // 1000, name),
+                                 measure(load, path, True) // count))
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Measures the per-property cost of saving, skipping, and loading small properties.
+
+Pass the directory of another cast.py to measure that version instead, for example an older checkout."""
+import io
+import os
+import sys
+import timeit
+
+if len(sys.argv) > 1:
+    sys.path.insert(0, os.path.abspath(sys.argv[1]))
+else:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "libraries", "python"))
+
+import cast
+
+
+def build(count):
+    """Builds count small properties, cycling through the common numeric types."""
+    templates = (("f", [1.0]),
+                 ("3v", [1.0, 2.0, 3.0]),
+                 ("4v", [0.0, 0.0, 0.0, 1.0]),
+                 ("h", [7]),
+                 ("l", [0x534E495752545250]))
+
+    properties = []
+
+    for i in range(count):
+        type, values = templates[i % len(templates)]
+
+        property = cast.CastProperty(name="p", type=type)
+        property.values = values
+        properties.append(property)
+
+    return properties
+
+
+def main(count=1000000):
+    properties = build(count)
+
+    def save():
+        file = io.BytesIO()
+
+        for property in properties:
+            property.save(file)
+
+        return file.getvalue()
+
+    buffer = save()
+
+    def skip():
+        offset = 0
+
+        for i in range(count):
+            offset = cast.CastProperty.skipBuffer(buffer, offset)
+
+    def load():
+        offset = 0
+
+        for i in range(count):
+            property = cast.CastProperty()
+            offset = property.loadBuffer(buffer, offset)
+            property.values
+
+    print("%d small properties (f, 3v, 4v, h, l), best of 3, per property" % count)
+
+    for name, function in (("save", save), ("skip", skip), ("load and decode", load)):
+        print("%-16s %.2fus" % (name, min(timeit.repeat(function, number=1, repeat=3)) / count * 1e6))
+
+
+if __name__ == "__main__":
+    main()
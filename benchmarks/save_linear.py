@@ -0,0 +1,81 @@
+"""Compares a single pass save against measuring every node's subtree again as it's written.
+
+Builds a model with a 10k bone skeleton, and an animation with 50k curves, then saves both ways."""
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "libraries", "python"))
+
+import cast
+
+
+def build(bones=10000, curves=50000):
+    """Builds a cast file with the given number of bones and curves."""
+    file = cast.Cast()
+    root = file.CreateRoot()
+
+    skeleton = root.CreateModel().CreateSkeleton()
+
+    for i in range(bones):
+        bone = skeleton.CreateBone()
+        bone.SetName("bone%d" % i)
+        bone.SetParentIndex(i - 1)
+        bone.SetLocalPosition((0.0, 1.0, 0.0))
+        bone.SetLocalRotation((0.0, 0.0, 0.0, 1.0))
+
+    animation = root.CreateAnimation()
+    animation.SetFramerate(30.0)
+
+    for i in range(curves):
+        curve = animation.CreateCurve()
+        curve.SetNodeName("bone%d" % (i % bones))
+        curve.SetKeyPropertyName("tx")
+        curve.SetKeyFrameBuffer([0, 15, 30])
+        curve.SetFloatKeyValueBuffer([0.0, 1.0, 0.0])
+        curve.SetMode("absolute")
+
+    return file
+
+
+def saveMeasuringEach(node, file):
+    """Saves a node the way it was saved before, measuring its whole subtree for every node written."""
+    file.write(cast.castNodeHeader.pack(node.identifier,
+                                        node.length(),
+                                        node.hash,
+                                        len(node.properties),
+                                        len(node.childNodes)))
+
+    for property in node.properties.values():
+        property.save(file)
+    for childNode in node.childNodes:
+        saveMeasuringEach(childNode, file)
+
+
+def main():
+    file = build()
+    sys.setrecursionlimit(10000)
+
+    def single():
+        result = io.BytesIO()
+        file.save(result)
+        return result
+
+    def measuringEach():
+        result = io.BytesIO()
+        result.write(cast.castFileHeader.pack(0x74736163, 0x1, len(file.rootNodes), 0))
+
+        for rootNode in file.rootNodes:
+            saveMeasuringEach(rootNode, result)
+        return result
+
+    if single().getvalue() != measuringEach().getvalue():
+        raise Exception("Saves don't match")
+
+    for name, save in (("measuring each node", measuringEach), ("single pass", single)):
+        print("%-20s %.3fs" % (name, min(timeit.repeat(save, number=1, repeat=3))))
+
+
+if __name__ == "__main__":
+    main()
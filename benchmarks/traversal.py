@@ -0,0 +1,123 @@
+"""Compares loading and saving with an explicit stack against one Python call per tree level.
+
+Builds 120k nodes, and a 5000 level hierarchy which the recursive traversal can't handle at the default limit."""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "libraries", "python"))
+
+import cast
+
+
+def build(models=1000, bones=118):
+    """Builds a cast file with the given number of models, each with a skeleton of bones."""
+    file = cast.Cast()
+    root = file.CreateRoot()
+
+    for i in range(models):
+        skeleton = root.CreateModel().CreateSkeleton()
+
+        for j in range(bones):
+            bone = skeleton.CreateBone()
+            bone.SetName("bone%d" % j)
+            bone.SetLocalPosition((0.0, 1.0, 0.0))
+
+    return file
+
+
+def buildDeep(depth=5000):
+    """Builds a cast file with a chain of nodes the given number of levels deep."""
+    file = cast.Cast()
+    node = file.CreateRoot()
+
+    for i in range(depth):
+        node = node.CreateChild(cast.CastNode(0x656E6F62))
+
+    return file
+
+
+def loadRecursive(buffer, offset):
+    """Loads a node the way it was loaded before, with one call per tree level."""
+    header = cast.castNodeHeader.unpack_from(buffer, offset)
+    node = cast.CastNode.loadNode(header[0], header[2])
+    offset += 0x18
+
+    if header[3]:
+        node._properties = {}
+
+        for i in range(header[3]):
+            property = cast.CastProperty()
+            offset = property.loadBuffer(buffer, offset)
+            node._properties[property.name] = property
+
+    if header[4]:
+        node._childNodes = []
+
+        for i in range(header[4]):
+            child, offset = loadRecursive(buffer, offset)
+            child.parentNode = node
+            node._childNodes.append(child)
+
+    return (node, offset)
+
+
+def saveRecursive(node, lengths, file):
+    """Saves a node the way it was saved before, with one call per tree level."""
+    properties = node.properties
+    childNodes = node.children()
+
+    file.write(cast.castNodeHeader.pack(node.identifier,
+                                        lengths[node],
+                                        node.hash,
+                                        len(properties),
+                                        len(childNodes)))
+
+    for property in properties.values():
+        property.save(file)
+    for childNode in childNodes:
+        saveRecursive(childNode, lengths, file)
+
+
+def main():
+    data = build().dumps()
+    file = cast.Cast.loads(data)
+    nodes = sum(1 for x in cast.castIterBufferEvents(data) if x.kind == "enter")
+
+    def load():
+        return cast.Cast.loads(data)
+
+    def recursiveLoad():
+        offset = 0x10
+
+        for i in range(len(file.rootNodes)):
+            offset = loadRecursive(data, offset)[1]
+
+    def save():
+        return file.dumps()
+
+    def recursiveSave():
+        lengths = {}
+        result = cast.CastBlob()
+
+        for rootNode in file.rootNodes:
+            rootNode.length(lengths)
+            saveRecursive(rootNode, lengths, result)
+
+    print("%d nodes, best of 7" % nodes)
+
+    for name, function in (("load, recursive", recursiveLoad), ("load, stack", load),
+                           ("save, recursive", recursiveSave), ("save, stack", save)):
+        print("%-20s %.3fs" % (name, min(timeit.repeat(function, number=1, repeat=7))))
+
+    deep = buildDeep()
+    cast.Cast.loads(deep.dumps())
+
+    try:
+        loadRecursive(deep.dumps(), 0x10)
+    except RecursionError:
+        print("5000 levels: the stack traversal loads and saves, the recursive one raises RecursionError")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,225 @@
+import io
+import os
+import re
+import sys
+import mmap
+import operator
+import collections
+import types
+import array
 import struct
+import shutil
+import tempfile
 import itertools
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import concurrent.futures
+except ImportError:
+    concurrent = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import zlib
+except ImportError:
+    zlib = None
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import bz2
+except ImportError:
+    bz2 = None
 
 castHashBase = 0x534E495752545250
 
+# Property payloads are decoded on first access, and payloads at least this large reference the file buffer instead
+# of being copied. Nodes whose payloads are all smaller keep their properties packed, as they're stored, until
+# they're read.
+castLazyPropertySize = 0x100
 
-def castNextHash():
-    global castHashBase
+# Number of elements packed at a time when writing untyped property payloads.
+castPayloadChunkSize = 0x10000
+
+# Number of payload structs, by element count, each property type keeps compiled.
+castPayloadStructCacheSize = 0x40
+
+# Serialized data is accumulated up to this size before it's written, larger payloads are written directly.
+castWriteBufferSize = 0x100000
+
+# Number of writes a background writer holds before serializing waits for the disk.
+castWriteQueueSize = 4
+
+# Shared by every node without children or properties, until one is added. Python 2 has no read only mapping, the
+# shared mapping is never written to either way.
+castEmptyChildNodes = ()
+
+try:
+    castEmptyProperties = types.MappingProxyType({})
+except AttributeError:
+    castEmptyProperties = {}
+
+# Property payloads smaller than this are stored as is by a codec policy, unless it's given another minimum size.
+castCodecMinimumSize = 0x400
+
+# Codec payloads stored at least this large are decoded in the shared decode pool, while loading continues.
+castDecodePoolSize = 0x40000
+
+# Files are only loaded by worker processes when they have at least this much data for each worker.
+castParallelLoadSize = 0x1000000
+
+# Number of threads in the shared decode pool, codecs release the GIL so large payloads decode at the same time.
+try:
+    castDecodeWorkers = os.cpu_count() or 1
+except AttributeError:
+    castDecodeWorkers = 1
+
+# Set in the flags of the file header when property payloads may be stored through a codec.
+castFileCodecs = 0x1
+
+# Set in the name size of a property header when its payload is stored through a codec.
+castPropertyCodec = 0x8000
+
+# Number of bytes read at a time when reading a string from a file.
+castStringBlockSize = 0x100
+
+# Finds the end of a string in buffers without a find method, like memoryview.
+castStringTerminator = re.compile(b'\x00')
+
+castFileHeader = struct.Struct("IIII")
+castNodeHeader = struct.Struct("IIQII")
+castPropertyHeader = struct.Struct("2sHI")
+castCodecHeader = struct.Struct("II")
+
+castIndexHeader = struct.Struct("IIQQI")
+castIndexEntry = struct.Struct("QIIQiH")
+
+# Python 2 converts a memoryview to its description with bytes, can't intern unicode strings, replaces files by
+# renaming them, and has no modified times in nanoseconds. Its memoryviews have no size in bytes, can't view arrays or mapped files, and aren't accepted by
+# codecs or regular expressions, so buffers are copied there instead.
+castPython2 = sys.version_info[0] < 3
+
+if not castPython2:
+    castBytes = bytes
+    castIntern = sys.intern
+    castReplace = os.replace
+    castViewSize = operator.attrgetter("nbytes")
+    castModifiedTime = operator.attrgetter("st_mtime_ns")
+
+    def castSlice(buffer, start, end):
+        """Returns a view of the given range of a buffer, without copying it."""
+        return memoryview(buffer)[start:end]
+
+    def castMapFile(file):
+        """Maps the given file for reading."""
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+else:
+    def castBytes(data):
+        """Copies the given buffer to bytes."""
+        if isinstance(data, memoryview):
+            return data.tobytes()
+        return bytes(data)
+
+    def castIntern(value):
+        """Returns the given string, Python 2 can only intern byte strings."""
+        return value
+
+    castReplace = os.rename
+
+    def castViewSize(view):
+        """Returns the size in bytes of the given memoryview."""
+        return view.itemsize * reduce(operator.mul, view.shape, 1)
+
+    def castModifiedTime(stat):
+        """Returns the modified time of the given file stat in nanoseconds."""
+        return int(stat.st_mtime * 1000000000)
+
+    def castSlice(buffer, start, end):
+        """Returns a copy of the given range of a buffer."""
+        return castBytes(buffer[start:end])
+
+    def castMapFile(file):
+        """Reads the given file, in place of mapping it."""
+        return file.read()
+
+
+class CastHashAllocator(object):
+    """Allocates unique node hashes, it's safe to share between threads, and can reserve blocks of hashes for other builders.
+
+    Used as a context manager, nodes created by the current thread take their hashes from this allocator."""
+    __slots__ = ("base", "end", "lock")
+
+    def __init__(self, base=castHashBase, count=None):
+        self.base = base
+        self.end = None if count is None else base + count
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        castHashAllocators.__dict__.setdefault("stack", []).append(self)
+        return self
+
+    def __exit__(self, *args):
+        castHashAllocators.stack.pop()
 
-    hash = castHashBase
-    castHashBase += 1
+    def nextHash(self):
+        """Allocates the next unique hash."""
+        with self.lock:
+            hash = self.base
 
-    return hash
+            if hash == self.end:
+                raise Exception("Hash allocator block is exhausted")
+
+            self.base = hash + 1
+
+        return hash
+
+    def reserve(self, count):
+        """Reserves a block of count hashes, returns an allocator for the block that a builder can use without contention."""
+        with self.lock:
+            base = self.base
+
+            if self.end is not None and base + count > self.end:
+                raise Exception("Hash allocator block is exhausted")
+
+            self.base += count
+
+        return CastHashAllocator(base, count)
+
+
+# The allocator used when the current thread hasn't entered one.
+castHashAllocator = CastHashAllocator()
+
+# The stack of allocators entered by each thread.
+castHashAllocators = threading.local()
+
+
+def castNextHash():
+    """Allocates the next unique hash from the current thread's allocator."""
+    stack = castHashAllocators.__dict__.get("stack")
+
+    if stack:
+        return stack[-1].nextHash()
+    return castHashAllocator.nextHash()
 
 
 def castTypeForMaximum(values):
-    maximum = max(values)
+    # Typed buffers are scanned with numpy when available, without copying.
+    if numpy is not None and castIsBuffer(values):
+        maximum = numpy.asarray(values).max()
+    else:
+        maximum = max(values)
 
     if maximum <= 0xFF:
         return "b"
@@ -24,6 +229,258 @@ def castTypeForMaximum(values):
         return "i"
 
 
+def castIsBuffer(values):
+    """Whether or not the values are a typed buffer (numpy array, array.array, or memoryview)."""
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return True
+    return isinstance(values, (array.array, memoryview))
+
+
+def castIsIntegral(values):
+    """Whether or not the values are a collection of integers."""
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return values.dtype.kind in "iu"
+    elif isinstance(values, array.array):
+        return values.typecode in "bBhHiIlLqQ"
+    elif isinstance(values, memoryview):
+        return values.format.lstrip("@=<>!") in "bBhHiIlLqQ"
+    return len(values) > 0 and isinstance(values[0], int)
+
+
+def castValues(values):
+    """Returns typed buffers as is, without copying, and any other collection of values as a list."""
+    if castIsBuffer(values):
+        return castFlatBuffer(values)
+    return list(values)
+
+
+def castFlatValues(values):
+    """Returns typed buffers as is, without copying, and flattens any other collection of vectors into a list."""
+    if castIsBuffer(values):
+        return castFlatBuffer(values)
+    return list(itertools.chain.from_iterable(values))
+
+
+def castFlatBuffer(values):
+    """Returns a typed buffer that can be counted and iterated element by element."""
+    if isinstance(values, memoryview) and values.ndim != 1:
+        if numpy is not None:
+            return numpy.asarray(values)
+        return values.cast("B").cast(values.format)
+    return values
+
+
+def castMaximumError(values, decoded):
+    """Returns the maximum absolute difference between two collections of values."""
+    if numpy is not None and isinstance(decoded, numpy.ndarray):
+        if not decoded.size:
+            return 0.0
+        return float(numpy.abs(numpy.asarray(values, dtype=numpy.float64) - decoded).max())
+    return max(itertools.chain((abs(x - y) for x, y in zip(values, decoded)), (0.0,)))
+
+
+def castDequantized(values, result, components):
+    """Returns vectorized dequantized values in the layout of the stored values, shaped (count, components) when backed by numpy."""
+    result = result.astype(numpy.float32)
+
+    if isinstance(values, numpy.ndarray):
+        return result.reshape(-1, components)
+    return tuple(result.reshape(-1).tolist())
+
+
+def castQuantizeBounded(values, components):
+    """Quantizes a flat collection of vectors to unorm16 against their bounding box, returns (values, bounds, maximum error).
+
+    The bounds are the minimum, then the maximum, of each component."""
+    if numpy is not None:
+        data = numpy.asarray(values, dtype=numpy.float64).reshape(-1, components)
+
+        if len(data):
+            bounds = numpy.concatenate((data.min(0), data.max(0))).astype(numpy.float32)
+        else:
+            bounds = numpy.zeros(components * 2, dtype=numpy.float32)
+
+        # The bounds are stored as floats, so quantize against what will be loaded.
+        minimum = bounds[:components].astype(numpy.float64)
+        extent = bounds[components:].astype(numpy.float64) - minimum
+        scale = numpy.divide(0xFFFF, extent, out=numpy.zeros_like(extent), where=extent > 0)
+
+        quantized = numpy.clip(numpy.rint((data - minimum) * scale), 0, 0xFFFF).astype("<u2")
+        error = castMaximumError(data, minimum + quantized * (extent / 0xFFFF))
+
+        return (quantized.reshape(-1), bounds, error)
+
+    count = len(values) // components
+
+    if count:
+        bounds = [min(values[i::components]) for i in range(components)] + \
+            [max(values[i::components]) for i in range(components)]
+    else:
+        bounds = [0.0] * (components * 2)
+
+    bounds = struct.unpack("<%df" % len(bounds), struct.pack("<%df" % len(bounds), *bounds))
+    minimum = bounds[:components]
+    extent = [y - x for x, y in zip(minimum, bounds[components:])]
+
+    quantized = [0] * len(values)
+    decoded = [0.0] * len(values)
+
+    for i, x in enumerate(values):
+        c = i % components
+        q = min(max(int(round((x - minimum[c]) * 0xFFFF / extent[c])), 0), 0xFFFF) if extent[c] > 0 else 0
+
+        quantized[i] = q
+        decoded[i] = minimum[c] + q * (extent[c] / 0xFFFF)
+
+    return (quantized, list(bounds), castMaximumError(values, decoded))
+
+
+def castDequantizeBounded(values, bounds, components):
+    """Dequantizes a flat collection of unorm16 vectors against the bounding box in the given bounds property."""
+    if bounds is None:
+        raise Exception("Quantized property is missing its bounds")
+
+    bounds = bounds.values
+
+    if numpy is not None:
+        bounds = numpy.asarray(bounds, dtype=numpy.float64)
+        minimum = bounds[:components]
+        step = (bounds[components:] - minimum) / 0xFFFF
+
+        data = numpy.asarray(values, dtype=numpy.float64).reshape(-1, components)
+
+        return castDequantized(values, minimum + data * step, components)
+
+    minimum = bounds[:components]
+    step = [(y - x) / 0xFFFF for x, y in zip(minimum, bounds[components:])]
+
+    return tuple(minimum[i % components] + x * step[i % components] for i, x in enumerate(values))
+
+
+# The offset of zero, and the scale of one, for octahedral vectors stored in each unsigned property type.
+castOctahedralScale = {"b": 0x7F, "h": 0x7FFF}
+
+
+def castEncodeOctahedral(values, type):
+    """Encodes a flat collection of direction vectors to two components each on the octahedron, returns (values, maximum error).
+
+    Components are stored as signed normalized integers, offset by castOctahedralScale into the unsigned type."""
+    scale = castOctahedralScale[type]
+
+    if numpy is not None:
+        data = numpy.asarray(values, dtype=numpy.float64).reshape(-1, 3)
+
+        length = numpy.abs(data).sum(1, keepdims=True)
+        data = numpy.divide(data, length, out=numpy.zeros_like(data), where=length > 0)
+        x, y, z = data[:, 0], data[:, 1], data[:, 2]
+
+        # The lower half of the octahedron is folded over the upper half.
+        fold = z < 0
+        x, y = numpy.where(fold, (1.0 - numpy.abs(y)) * numpy.where(x >= 0, 1.0, -1.0), x), \
+            numpy.where(fold, (1.0 - numpy.abs(x)) * numpy.where(y >= 0, 1.0, -1.0), y)
+
+        encoded = (numpy.rint(numpy.stack((x, y), 1) * scale) + scale).astype(castPropertyTypes[type].dtype)
+        encoded = encoded.reshape(-1)
+
+        direction = numpy.linalg.norm(data, axis=1, keepdims=True)
+        direction = numpy.divide(data, direction, out=numpy.zeros_like(data), where=direction > 0)
+
+        return (encoded, castMaximumError(direction.reshape(-1), castDecodeOctahedralArray(encoded, scale).reshape(-1)))
+
+    encoded = [0] * (len(values) // 3 * 2)
+    error = 0.0
+
+    for i in range(len(values) // 3):
+        x, y, z = values[i * 3:i * 3 + 3]
+
+        length = abs(x) + abs(y) + abs(z)
+        if length > 0:
+            x, y, z = x / length, y / length, z / length
+
+        if z < 0:
+            x, y = (1.0 - abs(y)) * (1.0 if x >= 0 else -1.0), (1.0 - abs(x)) * (1.0 if y >= 0 else -1.0)
+
+        encoded[i * 2] = int(round(x * scale)) + scale
+        encoded[i * 2 + 1] = int(round(y * scale)) + scale
+
+        length = (values[i * 3] ** 2 + values[i * 3 + 1] ** 2 + values[i * 3 + 2] ** 2) ** 0.5 or 1.0
+        decoded = castDecodeOctahedralVector(encoded[i * 2], encoded[i * 2 + 1], scale)
+
+        error = max(error, castMaximumError([x / length for x in values[i * 3:i * 3 + 3]], decoded))
+
+    return (encoded, error)
+
+
+def castDecodeOctahedralArray(values, scale):
+    """Decodes a numpy array of octahedral vectors to a (count, 3) array of unit vectors."""
+    data = numpy.clip((values.reshape(-1, 2).astype(numpy.float64) - scale) / scale, -1.0, 1.0)
+    x, y = data[:, 0], data[:, 1]
+    z = 1.0 - numpy.abs(x) - numpy.abs(y)
+
+    # Unfold the lower half of the octahedron.
+    t = numpy.maximum(-z, 0.0)
+    x = x - numpy.where(x >= 0, t, -t)
+    y = y - numpy.where(y >= 0, t, -t)
+
+    result = numpy.stack((x, y, z), 1)
+    return result / numpy.linalg.norm(result, axis=1, keepdims=True)
+
+
+def castDecodeOctahedralVector(x, y, scale):
+    """Decodes a single octahedral vector to a unit vector."""
+    x = min(max((x - scale) / scale, -1.0), 1.0)
+    y = min(max((y - scale) / scale, -1.0), 1.0)
+    z = 1.0 - abs(x) - abs(y)
+
+    t = max(-z, 0.0)
+    x += -t if x >= 0 else t
+    y += -t if y >= 0 else t
+
+    length = (x * x + y * y + z * z) ** 0.5
+    return (x / length, y / length, z / length)
+
+
+def castDecodeOctahedral(values, type):
+    """Decodes a flat collection of octahedral vectors stored in the given unsigned property type."""
+    scale = castOctahedralScale[type]
+
+    if numpy is not None:
+        return castDequantized(values, castDecodeOctahedralArray(numpy.asarray(values), scale), 3)
+
+    return tuple(itertools.chain.from_iterable(
+        castDecodeOctahedralVector(values[i], values[i + 1], scale) for i in range(0, len(values), 2)))
+
+
+def castQuantizeHalf(values):
+    """Rounds a flat collection of values to half floats, returns (values, maximum error)."""
+    if 'e' not in castPropertyFormats:
+        raise Exception("Half floats aren't supported by this version of Python")
+
+    if numpy is not None:
+        data = numpy.asarray(values, dtype=numpy.float64).reshape(-1)
+        with numpy.errstate(over="ignore"):
+            half = data.astype("<f2")
+
+        if numpy.isinf(half).any() and not numpy.isinf(data).any():
+            raise Exception("Values are out of range for half floats")
+
+        return (half, castMaximumError(data, half.astype(numpy.float64)))
+
+    try:
+        half = list(struct.unpack("<%de" % len(values), struct.pack("<%de" % len(values), *values)))
+    except OverflowError:
+        raise Exception("Values are out of range for half floats")
+
+    return (half, castMaximumError(values, half))
+
+
+def castDequantizeHalf(values, components):
+    """Widens a flat collection of half floats to floats."""
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return values.astype(numpy.float32).reshape(-1, components)
+    return values
+
+
 class CastString_t(object):
     __slots__ = ("value")
 
@@ -34,12 +491,28 @@ class CastString_t(object):
             self.load(file)
 
     def load(self, file):
-        bytes = b''
-        b = file.read(1)
-        while not b == b'\x00':
-            bytes += b
-            b = file.read(1)
-        self.value = bytes.decode("utf-8")
+        # Read in blocks, then move back to the end of the string, files that can't seek are read a byte at a time.
+        size = castStringBlockSize if file.seekable() else 1
+        value = bytearray()
+
+        while True:
+            block = file.read(size)
+
+            if not block:
+                raise Exception("Unterminated string")
+
+            end = block.find(b'\x00')
+
+            if end >= 0:
+                value += block[:end]
+
+                if end + 1 < len(block):
+                    file.seek(end + 1 - len(block), 1)
+                break
+
+            value += block
+
+        self.value = value.decode("utf-8")
 
     def save(self, file):
         file.write(self.value.encode("utf-8"))
@@ -47,33 +520,340 @@ class CastString_t(object):
 
 
 class CastProperty_t(object):
-    __slots__ = ("size", "fmt", "identifier", "array")
+    """A property type, shared by every property of that type, so it must not be modified."""
+    __slots__ = ("size", "fmt", "identifier", "array", "dtype", "element", "structs")
 
     def __init__(self, identifier=None):
-        switcher = {
-            'b': [1, "B", 1],
-            'h': [2, "H", 1],
-            'i': [4, "I", 1],
-            'l': [8, "Q", 1],
-            'f': [4, "f", 1],
-            'd': [8, "d", 1],
-            's': [0, "s", 1],
-            '2v': [8, "2f", 2],
-            '3v': [12, "3f", 3],
-            '4v': [16, "4f", 4]
-        }
-
-        if identifier is None:
-            self.size = 0
-            self.fmt = ""
-            self.identifier = None
-            self.array = 1
+        size, fmt, array, dtype = castPropertyFormats[identifier]
+
+        setattr = super(CastProperty_t, self).__setattr__
+
+        setattr("size", size)
+        setattr("fmt", fmt)
+        setattr("identifier", identifier)
+        setattr("array", array)
+        setattr("dtype", dtype)
+        setattr("element", struct.Struct("<" + fmt) if size else None)
+        setattr("structs", {})
+
+    def __setattr__(self, name, value):
+        raise Exception("Property types are shared and can't be modified")
+
+    def payloadStruct(self, count):
+        """Returns a precompiled struct for a payload of count elements of this type."""
+        if count == 1:
+            return self.element
+
+        payload = self.structs.get(count)
+
+        if payload is None:
+            payload = struct.Struct("<%d%s" % (count * self.array, self.fmt[-1]))
+
+            # Small properties repeat the same few counts, large payloads rarely share one.
+            if len(self.structs) < castPayloadStructCacheSize:
+                self.structs[count] = payload
+
+        return payload
+
+
+# The size, element format, number of components, and numpy dtype for each property type.
+castPropertyFormats = {
+    None: (0, "", 1, None),
+    'b': (1, "B", 1, "<u1"),
+    'h': (2, "H", 1, "<u2"),
+    'i': (4, "I", 1, "<u4"),
+    'l': (8, "Q", 1, "<u8"),
+    'f': (4, "f", 1, "<f4"),
+    'd': (8, "d", 1, "<f8"),
+    'e': (2, "e", 1, "<f2"),
+    's': (0, "s", 1, None),
+    '2v': (8, "2f", 2, "<f4"),
+    '3v': (12, "3f", 3, "<f4"),
+    '4v': (16, "4f", 4, "<f4")
+}
+
+# Python 2 can't pack half floats, so properties of that type aren't supported there.
+try:
+    struct.Struct("e")
+except struct.error:
+    del castPropertyFormats['e']
+
+castPropertyTypes = {x: CastProperty_t(x) for x in castPropertyFormats}
+
+# The property types by their identifier as it's stored in a property header.
+castPropertyHeaderTypes = {x.encode("utf-8").ljust(2, b'\x00'): y
+                           for x, y in castPropertyTypes.items() if x is not None}
+
+
+def castPropertyType(identifier):
+    """Returns the property type for the given identifier, which is shared by every property of that type."""
+    return castPropertyTypes[identifier]
+
+
+def castPropertyHeaderType(identifier):
+    """Returns the property type for the given identifier as it's stored in a property header."""
+    type = castPropertyHeaderTypes.get(identifier)
+    if type is None:
+        type = castPropertyType(identifier.decode("utf-8").strip('\0'))
+    return type
+
+
+def castReferences(node, scope, names):
+    """Collects the (property name, hash, node to resolve in) links for the given hash properties of a node."""
+    references = []
+
+    for name in names:
+        property = node._property(name)
+        if property is not None:
+            references.append((name, property.values[0], scope))
+
+    return references
+
+
+def castArrayLength(type, values):
+    """Returns the number of elements in a flat collection of values for the given property type."""
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return int(values.size / type.array)
+    return int(len(values) / type.array)
+
+
+def castBufferMatches(type, format, itemsize):
+    """Whether or not a native typed buffer already has the binary layout of the given property type."""
+    code = type.fmt[-1]
+
+    if sys.byteorder != "little":
+        return False
+    elif code in "efd":
+        return format == code
+    return format in "BHILQ" and itemsize == type.size // type.array
+
+
+def castPayloadChunks(type, values):
+    """Yields the packed payload of a flat collection of values for the given property type, in chunks."""
+    step = castPayloadChunkSize * type.array
+
+    if isinstance(values, (list, tuple)) and len(values) <= step:
+        yield type.payloadStruct(len(values) // type.array).pack(*values)
+        return
+    elif numpy is not None and isinstance(values, numpy.ndarray):
+        values = values.reshape(-1)
+
+        if values.dtype == numpy.dtype(type.dtype):
+            yield numpy.ascontiguousarray(values)
+        else:
+            for i in range(0, values.size, step):
+                yield values[i:i + step].astype(type.dtype)
+        return
+    elif isinstance(values, array.array):
+        if not castPython2 and castBufferMatches(type, values.typecode, values.itemsize):
+            yield values
             return
+    elif isinstance(values, memoryview):
+        if values.c_contiguous and castBufferMatches(type,
+                                                     values.format.lstrip("@"),
+                                                     values.itemsize):
+            yield values
+            return
+
+    for i in range(0, len(values), step):
+        chunk = values[i:i + step]
+
+        if isinstance(chunk, memoryview):
+            chunk = chunk.tolist()
+
+        yield type.payloadStruct(len(chunk) // type.array).pack(*chunk)
 
-        self.size = switcher[identifier][0]
-        self.fmt = switcher[identifier][1]
-        self.array = switcher[identifier][2]
+
+def castStringEnd(buffer, offset):
+    """Returns the offset of the null terminator of the string in the given buffer at offset."""
+    if isinstance(buffer, memoryview):
+        return castStringTerminator.search(buffer, offset).start()
+    return buffer.find(b'\x00', offset)
+
+
+def castWriteBuffered(file, buffer, data):
+    """Appends data to the buffer, writing large data to the file directly instead of copying it."""
+    view = memoryview(data)
+
+    if castViewSize(view) < castWriteBufferSize:
+        buffer += view
+        return
+
+    if buffer:
+        file.write(buffer)
+        del buffer[:]
+
+    file.write(data)
+
+
+class CastCodec(object):
+    """A codec that property payloads can be stored through, registered with castRegisterCodec."""
+    __slots__ = ("identifier", "name", "compress", "decompress")
+
+    def __init__(self, identifier, name, compress, decompress):
         self.identifier = identifier
+        self.name = name
+        self.compress = compress
+        self.decompress = decompress
+
+
+# The registered codecs, by their identifier as it's stored in a property, and by name.
+castCodecs = {}
+castCodecNames = {}
+
+
+def castRegisterCodec(identifier, name, compress, decompress):
+    """Registers a codec that compresses and decompresses payload bytes, identifiers below 0x100 are reserved for built in codecs.
+
+    decompress is called with the stored bytes and the most bytes it may produce, and should stop there rather than
+    decompress the whole payload, so a payload that claims to be small can't expand into a much larger one."""
+    if identifier == 0 or identifier > 0xFFFFFFFF:
+        raise Exception("Invalid property codec identifier: %d" % identifier)
+
+    codec = CastCodec(identifier, name, compress, decompress)
+
+    castCodecs[identifier] = codec
+    castCodecNames[name] = codec
+
+    return codec
+
+
+def castCodec(codec):
+    """Returns the registered codec for the given name, identifier, or codec."""
+    if isinstance(codec, CastCodec):
+        return codec
+
+    result = castCodecNames.get(codec) or castCodecs.get(codec)
+
+    if result is None:
+        raise Exception("Unknown property codec: %s" % codec)
+    return result
+
+
+def castDecodePayload(identifier, stored, size):
+    """Decompresses a property payload stored through the codec with the given identifier, which must be size bytes."""
+    codec = castCodecs.get(identifier)
+
+    if codec is None:
+        raise Exception("Unknown property codec: %d" % identifier)
+
+    # One byte more than the payload should be is enough to tell that it's too large.
+    payload = codec.decompress(stored, size + 1)
+
+    if len(payload) != size:
+        raise Exception("Invalid %s property payload" % codec.name)
+    return payload
+
+
+# The shared pool that large codec payloads are decoded in, created on first use.
+castDecodePool = None
+castDecodePoolLock = threading.Lock()
+
+
+def castDecodeExecutor():
+    """Returns the shared thread pool that large codec payloads are decoded in."""
+    global castDecodePool
+
+    with castDecodePoolLock:
+        if castDecodePool is None:
+            castDecodePool = concurrent.futures.ThreadPoolExecutor(castDecodeWorkers,
+                                                                   thread_name_prefix="castDecode")
+    return castDecodePool
+
+
+def castDecodeForked():
+    """Drops the decode pool inherited from the parent of a forked process, its threads don't exist in the child."""
+    global castDecodePool, castDecodePoolLock
+
+    castDecodePool = None
+    castDecodePoolLock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=castDecodeForked)
+
+
+def castJoinPayloads(pending):
+    """Waits for the payloads of the given properties being decoded in the shared decode pool."""
+    for property in pending:
+        property._raw = property._raw.result()
+
+
+def castZlibDecompress(stored, maximum):
+    """Decompresses a zlib payload, producing at most maximum bytes."""
+    return zlib.decompressobj().decompress(stored, maximum)
+
+
+def castLzmaDecompress(stored, maximum):
+    """Decompresses an lzma payload, producing at most maximum bytes."""
+    return lzma.LZMADecompressor().decompress(stored, max_length=maximum)
+
+
+def castBz2Decompress(stored, maximum):
+    """Decompresses a bz2 payload, producing at most maximum bytes, or about one block past it on Python 2."""
+    decompressor = bz2.BZ2Decompressor()
+
+    if not castPython2:
+        return decompressor.decompress(stored, max_length=maximum)
+
+    # Python 2 can't limit the output, so the payload is fed a piece at a time until there's enough of it.
+    payload = []
+    produced = 0
+
+    for start in range(0, len(stored), 0x1000):
+        try:
+            payload.append(decompressor.decompress(stored[start:start + 0x1000]))
+        except EOFError:
+            break
+
+        produced += len(payload[-1])
+
+        if produced >= maximum:
+            break
+
+    return b"".join(payload)[:maximum]
+
+
+if zlib is not None:
+    castRegisterCodec(0x1, "zlib", zlib.compress, castZlibDecompress)
+if lzma is not None:
+    castRegisterCodec(0x2, "lzma", lzma.compress, castLzmaDecompress)
+if bz2 is not None:
+    castRegisterCodec(0x3, "bz2", bz2.compress, castBz2Decompress)
+
+
+class CastCodecPolicy(object):
+    """Picks the codec each property payload is stored through when saving, by property name, type, or size.
+
+    Names and types map property names, or type identifiers, to a codec, or None to store them as is. Other
+    payloads use the default codec. Payloads smaller than minimumSize, strings, and payloads a codec can't shrink
+    are always stored as is."""
+    __slots__ = ("codec", "names", "types", "minimumSize")
+
+    def __init__(self, codec=None, names=None, types=None, minimumSize=castCodecMinimumSize):
+        self.codec = castCodec(codec) if codec is not None else None
+        self.names = {x: castCodec(y) if y is not None else None for x, y in (names or {}).items()}
+        self.types = {x: castCodec(y) if y is not None else None for x, y in (types or {}).items()}
+        self.minimumSize = minimumSize
+
+    def codecFor(self, property):
+        """Returns the codec to store the payload of the given property through, or None to store it as is."""
+        type = property.type
+
+        if type.size == 0 or type.size * property.arrayLength() < self.minimumSize:
+            return None
+        elif property.name in self.names:
+            return self.names[property.name]
+        elif type.identifier in self.types:
+            return self.types[type.identifier]
+        return self.codec
+
+
+def castCodecPolicy(codecs):
+    """Returns the codec policy for the given policy, or codec to store every payload through, or None."""
+    if codecs is None or isinstance(codecs, CastCodecPolicy):
+        return codecs
+    return CastCodecPolicy(codecs)
 
 
 class CastColor:
@@ -126,104 +906,662 @@ class CastColor:
 class CastProperty(object):
     """A single property for a cast node."""
 
-    __slots__ = ("name", "type", "values")
+    __slots__ = ("name", "type", "_values", "_raw", "_useNumpy")
 
-    def __init__(self, file=None, name=None, type=None):
+    def __init__(self, file=None, name=None, type=None, useNumpy=False):
         self.name = name or ""
-        self.type = CastProperty_t(type)
-        self.values = []
+        self.type = castPropertyTypes[type]
+        self._values = []
+        self._raw = None
+        self._useNumpy = False
 
         if file is not None:
-            self.load(file)
+            self.load(file, useNumpy)
+
+    @property
+    def values(self):
+        """The values of this property, decoded from the raw payload on first access."""
+        if self._raw is not None:
+            self.decode()
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+        self._raw = None
+
+    def decode(self):
+        """Decodes the raw payload of this property, which is then no longer written verbatim."""
+        raw = self._raw
+        type = self.type
+
+        if self._useNumpy and numpy is not None:
+            self._values = numpy.frombuffer(raw, dtype=type.dtype)
+        elif len(raw) == type.size:
+            self._values = type.element.unpack(raw)
+        else:
+            self._values = type.payloadStruct(len(raw) // type.size).unpack(raw)
 
-    def load(self, file):
+        self._raw = None
+
+    def load(self, file, useNumpy=False):
         """Loads a cast property from the given file."""
-        header = struct.unpack("2sHI", file.read(0x8))
+        header = castPropertyHeader.unpack(file.read(0x8))
+        nameSize = header[1] & ~castPropertyCodec
 
-        self.name = struct.unpack(("%ds" % header[1]),
-                                  file.read(header[1]))[0].decode("utf-8")
-        self.type = CastProperty_t(header[0].decode("utf-8").strip('\0'))
+        self.name = struct.unpack(("%ds" % nameSize),
+                                  file.read(nameSize))[0].decode("utf-8")
+        self.type = castPropertyHeaderType(header[0])
 
         if (self.type.size == 0 and self.type.fmt == "s"):
             self.values = [CastString_t(file).value]
+        elif header[1] & castPropertyCodec:
+            codec, storedSize = castCodecHeader.unpack(file.read(0x8))
+            self._raw = castDecodePayload(codec, file.read(storedSize), self.type.size * header[2])
+            self._useNumpy = useNumpy
+        elif useNumpy and numpy is not None:
+            self.values = numpy.frombuffer(file.read(self.type.size * header[2]),
+                                           dtype=self.type.dtype)
         else:
             self.values = [None] * header[2]
-            self.values = struct.unpack(self.type.fmt * header[2],
-                                        file.read(self.type.size * header[2]))
+            self.values = self.type.payloadStruct(header[2]).unpack(
+                file.read(self.type.size * header[2]))
+
+    def loadBuffer(self, buffer, offset, useNumpy=False, pending=None):
+        """Loads a cast property from the given buffer at offset, returns the offset following it.
+
+        When pending is given, a large codec payload is decoded in the shared decode pool and this property is added
+        to pending, which must be joined with castJoinPayloads before the property is used."""
+        header = castPropertyHeader.unpack_from(buffer, offset)
+        offset += 0x8
+
+        type = castPropertyHeaderTypes.get(header[0]) or castPropertyHeaderType(header[0])
+        size = type.size * header[2]
+
+        nameSize = header[1] & ~castPropertyCodec
+
+        self.name = castIntern(castBytes(buffer[offset:offset + nameSize]).decode("utf-8"))
+        self.type = type
+        self._values = None
+        offset += nameSize
+
+        if (type.size == 0 and type.fmt == "s"):
+            end = castStringEnd(buffer, offset)
+            self.values = [castBytes(buffer[offset:end]).decode("utf-8")]
+            return end + 1
+        elif header[1] & castPropertyCodec:
+            codec, storedSize = castCodecHeader.unpack_from(buffer, offset)
+            offset += 0x8
+
+            if pending is not None and storedSize >= castDecodePoolSize and castDecodeWorkers > 1:
+                self._raw = castDecodeExecutor().submit(castDecodePayload, codec,
+                                                        castSlice(buffer, offset, offset + storedSize), size)
+                pending.append(self)
+            else:
+                self._raw = castDecodePayload(codec, buffer[offset:offset + storedSize], size)
+            self._useNumpy = useNumpy
+
+            return offset + storedSize
+        elif size >= castLazyPropertySize:
+            self._raw = castSlice(buffer, offset, offset + size)
+            self._useNumpy = useNumpy
+        else:
+            # Small payloads are kept packed, which is far more compact than a tuple of Python numbers.
+            self._raw = castBytes(buffer[offset:offset + size])
+            self._useNumpy = useNumpy
 
-    def save(self, file):
-        """Saves this cast property to the given file."""
-        identifier = self.type.identifier.encode("utf-8")
-        name = self.name.encode("utf-8")
+        return offset + size
+
+    @staticmethod
+    def skipBuffer(buffer, offset):
+        """Skips over the cast property in the given buffer at offset, returns the offset following it."""
+        header = castPropertyHeader.unpack_from(buffer, offset)
+        offset += 0x8 + (header[1] & ~castPropertyCodec)
+
+        type = castPropertyHeaderType(header[0])
+
+        if (type.size == 0 and type.fmt == "s"):
+            return castStringEnd(buffer, offset) + 1
+        elif header[1] & castPropertyCodec:
+            return offset + 0x8 + castCodecHeader.unpack_from(buffer, offset)[1]
+
+        return offset + type.size * header[2]
+
+    def encode(self, codecs):
+        """Returns the (codec identifier, stored payload) of this property for the given codec policy, or None when it's stored as is."""
+        codec = codecs.codecFor(self)
+
+        if codec is None:
+            return None
+
+        if self._raw is not None:
+            payload = self._raw
+        else:
+            payload = b"".join(castPayloadChunks(self.type, self.values))
+
+        stored = codec.compress(payload)
+
+        # Payloads the codec can't shrink are stored as is.
+        if len(stored) + castCodecHeader.size >= castViewSize(memoryview(payload)):
+            return None
+        return (codec.identifier, stored)
 
-        file.write(struct.pack("2sHI",
-                               identifier,
-                               len(name),
-                               int(len(self.values) / self.type.array)))
-        file.write(name)
+    def detach(self):
+        """Copies a payload, or numpy values, that reference the buffer this property was loaded from."""
+        if isinstance(self._raw, memoryview):
+            self._raw = castBytes(self._raw)
+        elif numpy is not None and isinstance(self._values, numpy.ndarray) and isinstance(self._values.base, memoryview):
+            self._values = self._values.copy()
 
-        if self.type.size == 0 and self.type.fmt == "s":
-            string = CastString_t()
-            string.value = self.values[0]
+    def save(self, file, buffer=None, encoded=None):
+        """Saves this cast property to the given file, accumulating the data in buffer when given.
 
-            string.save(file)
+        When encoded is set, the (codec identifier, stored payload) from encode is written as the payload."""
+        identifier = self.type.identifier.encode("utf-8")
+        name = self.name.encode("utf-8")
+
+        if buffer is None:
+            buffer = bytearray()
+            flush = True
+        else:
+            flush = False
+
+        buffer += castPropertyHeader.pack(identifier,
+                                          len(name) | (castPropertyCodec if encoded else 0),
+                                          self.arrayLength())
+        buffer += name
+
+        if encoded is not None:
+            buffer += castCodecHeader.pack(encoded[0], len(encoded[1]))
+            castWriteBuffered(file, buffer, encoded[1])
+        elif self.type.size == 0 and self.type.fmt == "s":
+            buffer += self.values[0].encode("utf-8")
+            buffer += b'\x00'
+        elif self._raw is not None:
+            castWriteBuffered(file, buffer, self._raw)
         else:
-            file.write(struct.pack(self.type.fmt *
-                                   int(len(self.values) / self.type.array), *self.values))
+            for chunk in castPayloadChunks(self.type, self.values):
+                castWriteBuffered(file, buffer, chunk)
 
-    def length(self):
-        """Returns the length in bytes of this cast property."""
+        if flush or len(buffer) >= castWriteBufferSize:
+            file.write(buffer)
+            del buffer[:]
+
+    def length(self, encoded=None):
+        """Returns the length in bytes of this cast property, stored as the given encoded payload when set."""
         result = 0x8
 
         result += len(self.name.encode("utf-8"))
 
-        if self.type.size == 0 and self.type.fmt == "s":
+        if encoded is not None:
+            result += castCodecHeader.size + len(encoded[1])
+        elif self.type.size == 0 and self.type.fmt == "s":
             result += len(self.values[0].encode("utf-8")) + 1
         else:
-            result += self.type.size * int(len(self.values) / self.type.array)
+            result += self.type.size * self.arrayLength()
 
         return result
 
+    def arrayLength(self):
+        """Returns the number of elements in this cast property."""
+        if self._raw is not None:
+            return int(len(self._raw) / self.type.size)
+        return castArrayLength(self.type, self.values)
+
+    def buffer(self):
+        """Returns the values of this cast property, shaped (count, components) when backed by numpy."""
+        if numpy is not None and isinstance(self.values, numpy.ndarray) and self.type.array > 1:
+            return self.values.reshape(-1, self.type.array)
+        return self.values
+
     def isType(self, identifier):
         """Returns true if the type identifier for this cast property matches."""
         return self.type.identifier == identifier
 
+    def __getstate__(self):
+        # Raw payloads may reference a file buffer, so they're copied, unless they've been replaced by their location.
+        raw = self._raw
+        if raw is not None and not isinstance(raw, tuple):
+            raw = castBytes(raw)
 
-class CastNode(object):
-    """A single generic cast node."""
+        return (self.name, self.type.identifier, self._values, raw, self._useNumpy)
 
-    __slots__ = ("identifier", "hash", "parentNode",
-                 "childNodes", "properties")
+    def __setstate__(self, state):
+        self.name, identifier, self._values, self._raw, self._useNumpy = state
+        self.type = castPropertyTypes[identifier]
 
-    def __init__(self, identifier=0):
-        self.childNodes = []
-        self.properties = {}
-        self.identifier = identifier
-        self.hash = castNextHash()
-        self.parentNode = None
 
-    def ChildOfType(self, pType):
-        """Finds the first child that matches the given type."""
-        for x in self.childNodes:
-            if x.__class__ is pType:
-                return x
-        return None
+def castPackProperty(name, type, values):
+    """Returns the serialized property with the given name, type, and values, or None when it can't be kept packed."""
+    type = castPropertyTypes[type]
 
-    def ChildrenOfType(self, pType):
-        """Finds all children that match the given type."""
-        return [x for x in self.childNodes if x.__class__ is pType]
+    if type.size == 0 and type.fmt == "s":
+        if len(values) != 1 or values[0].__class__ is not str:
+            return None
+
+        count = 1
+        payload = values[0].encode("utf-8") + b'\x00'
+    elif (values.__class__ is list or values.__class__ is tuple) and type.size and \
+            len(values) * type.size < castLazyPropertySize * type.array:
+        count = len(values) // type.array
+
+        try:
+            payload = type.payloadStruct(count).pack(*values)
+        except struct.error:
+            return None
+    else:
+        return None
+
+    name = name.encode("utf-8")
+
+    return castPropertyHeader.pack(type.identifier.encode("utf-8"), len(name), count) + name + payload
+
+
+def castPackedEnd(buffer, offset, count):
+    """Returns the end of the count properties in the given buffer at offset, or None when they can't be kept packed.
+
+    Properties can be kept packed when none is stored through a codec, and every payload is smaller than
+    castLazyPropertySize, strings of any length included."""
+    for i in range(count):
+        header = castPropertyHeader.unpack_from(buffer, offset)
+
+        if header[1] & castPropertyCodec:
+            return None
+
+        type = castPropertyHeaderTypes.get(header[0]) or castPropertyHeaderType(header[0])
+        offset += 0x8 + header[1]
+
+        if type.size == 0 and type.fmt == "s":
+            offset = castStringEnd(buffer, offset) + 1
+        elif type.size * header[2] < castLazyPropertySize:
+            offset += type.size * header[2]
+        else:
+            return None
+
+    return offset
+
+
+def castPackedFind(packed, name):
+    """Returns the (offset, payload offset, end, element count, type) of the property with the given name in packed properties, or None."""
+    key = name.encode("utf-8")
+    offset = 0
+
+    while offset < len(packed):
+        identifier, nameSize, count = castPropertyHeader.unpack_from(packed, offset)
+        type = castPropertyHeaderTypes.get(identifier) or castPropertyHeaderType(identifier)
+        start = offset + 0x8 + nameSize
+
+        # Strings are the only packed properties without a fixed size.
+        if type.size == 0:
+            end = packed.index(b'\x00', start) + 1
+        else:
+            end = start + type.size * count
+
+        if nameSize == len(key) and packed.startswith(key, offset + 0x8):
+            return (offset, start, end, count, type)
+
+        offset = end
+
+    return None
+
+
+def castPackedReplace(packed, name, property):
+    """Returns packed properties with the property of the given name replaced by, or followed by, a serialized property."""
+    found = castPackedFind(packed, name)
+
+    if found is None:
+        return packed + property
+    return packed[:found[0]] + property + packed[found[2]:]
+
+
+def castPackedCount(packed):
+    """Returns the number of properties in packed properties."""
+    count = 0
+    offset = 0
+
+    while offset < len(packed):
+        offset = CastProperty.skipBuffer(packed, offset)
+        count += 1
+
+    return count
+
+
+def castUnpackProperties(packed):
+    """Decodes packed properties to a dictionary of properties by name."""
+    properties = {}
+    offset = 0
+
+    # Packed properties are never stored through a codec, so the values are decoded directly.
+    while offset < len(packed):
+        identifier, nameSize, count = castPropertyHeader.unpack_from(packed, offset)
+        type = castPropertyHeaderTypes.get(identifier) or castPropertyHeaderType(identifier)
+        start = offset + 0x8 + nameSize
+
+        property = CastProperty.__new__(CastProperty)
+        property.name = castIntern(packed[offset + 0x8:start].decode("utf-8"))
+        property.type = type
+        property._raw = None
+        property._useNumpy = False
+
+        if type.size == 0:
+            offset = packed.index(b'\x00', start) + 1
+            property._values = [packed[start:offset - 1].decode("utf-8")]
+        else:
+            offset = start + type.size * count
+            property._values = type.payloadStruct(count).unpack_from(packed, start)
+
+        properties[property.name] = property
+
+    return properties
+
+
+class CastFilter(object):
+    """Selects which nodes and properties are decoded when loading a cast file.
+
+    Nodes of the included types are decoded along with everything within them. Nodes of other types are kept without
+    their properties, so included types are found wherever they sit. Excluded types are skipped with everything within
+    them, and only the given properties are decoded."""
+    __slots__ = ("includeTypes", "excludeTypes", "properties", "subtreeFilter")
+
+    def __init__(self, includeTypes=None, excludeTypes=None, properties=None):
+        # Types may be given as node classes, or cast ids.
+        if includeTypes is not None:
+            self.includeTypes = {typeIdentifiers.get(x, x) for x in includeTypes}
+        else:
+            self.includeTypes = None
+        if excludeTypes is not None:
+            self.excludeTypes = {typeIdentifiers.get(x, x) for x in excludeTypes}
+        else:
+            self.excludeTypes = None
+        if properties is not None:
+            self.properties = {x.encode("utf-8") for x in properties}
+        else:
+            self.properties = None
+
+        # Within included types only the excluded types and properties still apply, if there are any.
+        if self.includeTypes is None:
+            self.subtreeFilter = self
+        elif self.excludeTypes is None and self.properties is None:
+            self.subtreeFilter = None
+        else:
+            self.subtreeFilter = CastFilter(None, self.excludeTypes)
+            self.subtreeFilter.properties = self.properties
+
+    def includesNode(self, buffer, offset):
+        """Whether or not the node at offset, and its children, should be loaded."""
+        return self.excludeTypes is None or castNodeHeader.unpack_from(buffer, offset)[0] not in self.excludeTypes
+
+    def includesProperties(self, identifier):
+        """Whether or not the properties of a node of the given type should be decoded."""
+        return self.includeTypes is None or identifier in self.includeTypes
+
+    def childFilter(self, identifier):
+        """Returns the filter for the children of a node of the given type, or None when they're decoded in full."""
+        if self.includeTypes is not None and identifier in self.includeTypes:
+            return self.subtreeFilter
+        return self
+
+    def includesProperty(self, buffer, offset):
+        """Whether or not the property at offset should be decoded."""
+        if self.properties is None:
+            return True
+
+        nameSize = castPropertyHeader.unpack_from(buffer, offset)[1] & ~castPropertyCodec
+
+        return castBytes(buffer[offset + 0x8:offset + 0x8 + nameSize]) in self.properties
+
+
+def castChildHashes(childNodes):
+    """Builds the registry of the given children by their hash, the first child with a hash wins."""
+    childHashes = {}
+
+    for x in childNodes:
+        childHashes.setdefault(x._hash, x)
+
+    return childHashes
+
+
+def castChildNodesMutator(name):
+    """Wraps the list method with the given name, so calling it resets the child lookups of the node."""
+    method = getattr(list, name)
+
+    def mutator(self, *args, **kwargs):
+        node = self.node
+        node._childHashes = None
+        node._childTypes = None
+        return method(self, *args, **kwargs)
+
+    mutator.__name__ = name
+    return mutator
+
+
+class CastChildNodes(list):
+    """The children of a node, modifying them resets the child lookups of the node."""
+    __slots__ = ("node")
+
+    def __init__(self, node, childNodes=()):
+        super(CastChildNodes, self).__init__(childNodes)
+        self.node = node
+
+    def __reduce__(self):
+        # Copies aren't tied to the node.
+        return (list, (list(self),))
+
+    __setitem__ = castChildNodesMutator("__setitem__")
+    __delitem__ = castChildNodesMutator("__delitem__")
+    __iadd__ = castChildNodesMutator("__iadd__")
+    __imul__ = castChildNodesMutator("__imul__")
+    append = castChildNodesMutator("append")
+    extend = castChildNodesMutator("extend")
+    insert = castChildNodesMutator("insert")
+    remove = castChildNodesMutator("remove")
+    pop = castChildNodesMutator("pop")
+    sort = castChildNodesMutator("sort")
+    reverse = castChildNodesMutator("reverse")
+
+    # Python 2 lists have no clear, and modify simple slices through their own methods.
+    if hasattr(list, "clear"):
+        clear = castChildNodesMutator("clear")
+    if hasattr(list, "__setslice__"):
+        __setslice__ = castChildNodesMutator("__setslice__")
+        __delslice__ = castChildNodesMutator("__delslice__")
+
+
+class CastNode(object):
+    """A single generic cast node."""
+
+    __slots__ = ("identifier", "_hash", "parentNode",
+                 "_childNodes", "_childHashes", "_childTypes", "_properties", "_source")
+
+    def __init__(self, identifier=0):
+        self._childNodes = castEmptyChildNodes
+        self._childHashes = None
+        self._childTypes = None
+        self._properties = castEmptyProperties
+        self._source = None
+        self.identifier = identifier
+        self._hash = castNextHash()
+        self.parentNode = None
+
+    @property
+    def hash(self):
+        """The unique hash of this node, changing it resets the child lookups of the parent."""
+        return self._hash
+
+    @hash.setter
+    def hash(self, hash):
+        self._hash = hash
+
+        if self.parentNode is not None:
+            self.parentNode._childHashes = None
+
+    @property
+    def childNodes(self):
+        """The children of this node, decoded on first access when loaded lazily.
+
+        Modifying the collection resets the child lookups of this node."""
+        childNodes = self.children()
+        if childNodes.__class__ is not CastChildNodes:
+            childNodes = self._childNodes = CastChildNodes(self, childNodes)
+        return childNodes
+
+    @childNodes.setter
+    def childNodes(self, childNodes):
+        # The children are copied into a collection that resets the child lookups when it's modified.
+        if childNodes.__class__ is not CastChildNodes or childNodes.node is not self:
+            childNodes = CastChildNodes(self, childNodes)
+
+        self._childNodes = childNodes
+        self._childHashes = None
+        self._childTypes = None
+
+    @property
+    def properties(self):
+        """The properties of this node, decoded on first access when loaded lazily, or when they're kept packed."""
+        if self._properties is None:
+            self._loadProperties()
+
+        properties = self._properties
+
+        if properties.__class__ is bytes:
+            properties = self._properties = castUnpackProperties(properties)
+        elif properties is castEmptyProperties:
+            properties = self._properties = {}
+
+        return properties
+
+    @properties.setter
+    def properties(self, properties):
+        self._properties = properties
+
+    def __getstate__(self):
+        # The parent and the lookup registries are restored when unpickling.
+        if self._properties is None:
+            self._loadProperties()
+
+        return (self.identifier, self._hash, self._properties or None, self.children() or None)
+
+    def __setstate__(self, state):
+        self.identifier, self._hash, properties, childNodes = state
+        self.parentNode = None
+        self._childHashes = None
+        self._childTypes = None
+        self._source = None
+        self._properties = properties or castEmptyProperties
+        self._childNodes = childNodes or castEmptyChildNodes
+
+        for child in self._childNodes:
+            child.parentNode = self
+
+    def ChildOfType(self, pType):
+        """Finds the first child that matches the given type."""
+        children = self.childTypes().get(pType)
+        if children:
+            return children[0]
+        return None
+
+    def ChildrenOfType(self, pType):
+        """Finds all children that match the given type, as a tuple."""
+        return self.childTypes().get(pType, ())
+
+    def _propertyMap(self):
+        """The properties of this node, which may be the shared empty mapping that must not be modified.
+
+        Properties kept packed are decoded once, on first read, and the node keeps the decoded properties."""
+        if self._properties is None:
+            self._loadProperties()
+
+        properties = self._properties
+
+        if properties.__class__ is bytes:
+            properties = self._properties = castUnpackProperties(properties)
+        return properties
+
+    def _property(self, name):
+        """Finds the property with the given name, without allocating properties for a node that has none."""
+        return self._propertyMap().get(name)
+
+    def _setProperty(self, name, type, values):
+        """Sets the values of the property with the given name and type, keeping small properties packed while they all are."""
+        if self._properties is None:
+            self._loadProperties()
+
+        properties = self._properties
+
+        if properties is castEmptyProperties or properties.__class__ is bytes:
+            property = castPackProperty(name, type, values)
+
+            if property is not None:
+                if properties is castEmptyProperties:
+                    self._properties = property
+                else:
+                    self._properties = castPackedReplace(properties, name, property)
+                return
+
+        self.CreateProperty(name, type).values = values
+
+    def children(self):
+        """The children of this node, which may be a shared empty collection that must not be modified."""
+        if self._childNodes is None:
+            self._loadChildren()
+        return self._childNodes
+
+    def childTypes(self):
+        """The children of this node bucketed by their type, each bucket is a tuple."""
+        childNodes = self.children()
+        childTypes = self._childTypes
+
+        if not childNodes:
+            return {}
+
+        # The buckets are built on first use, and reset when the children are modified.
+        if childTypes is None:
+            childTypes = {}
+
+            for x in childNodes:
+                childTypes.setdefault(x.__class__, []).append(x)
+
+            childTypes = self._childTypes = {x: tuple(y) for x, y in childTypes.items()}
+
+        return childTypes
 
     def ChildByHash(self, hash):
         """Finds a child by the given hash."""
-        find = [x for x in self.childNodes if x.hash == hash]
-        if len(find) > 0:
-            return find[0]
-        return None
+        childNodes = self.children()
+        childHashes = self._childHashes
+
+        if not childNodes:
+            return None
+
+        # The hash registry is built on first use, and reset when the children are modified or given a new hash.
+        if childHashes is None:
+            childHashes = self._childHashes = castChildHashes(childNodes)
+
+        return childHashes.get(hash)
+
+    def References(self):
+        """The hashes this node links to, as a collection of (property name, hash, node to resolve in)."""
+        return []
 
     def Hash(self):
         """The unique hash of this node."""
         return self.hash
 
+    def _removeProperty(self, name):
+        """Removes the property with the given name if there is one, properties kept packed stay packed."""
+        if self._properties is None:
+            self._loadProperties()
+
+        properties = self._properties
+
+        if properties.__class__ is bytes:
+            found = castPackedFind(properties, name)
+
+            if found is not None:
+                self._properties = properties[:found[0]] + properties[found[2]:] or castEmptyProperties
+        elif properties:
+            properties.pop(name, None)
+
     def CreateProperty(self, name, type):
         """Creates a new property with the given name and type."""
         property = CastProperty(file=None, name=name, type=type)
@@ -233,107 +1571,401 @@ class CastNode(object):
     def CreateChild(self, child):
         """Creates a new child in this node."""
         child.parentNode = self
-        self.childNodes.append(child)
+        list.append(self.childNodes, child)
+
+        if self._childHashes is not None:
+            self._childHashes.setdefault(child._hash, child)
+
+        # The buckets are immutable, so they're rebuilt when next used.
+        self._childTypes = None
+
         return child
 
     @staticmethod
-    def load(file):
+    def load(file, useNumpy=False):
         """Loads a cast node from the given file."""
-        header = struct.unpack("IIQII", file.read(0x18))
+        header = file.read(0x18)
+        buffer = header + file.read(castNodeHeader.unpack(header)[1] - 0x18)
 
-        if header[0] in typeSwitcher:
-            node = typeSwitcher[header[0]]()
+        return CastNode.loadBuffer(buffer, 0, useNumpy)[0]
+
+    @staticmethod
+    def loadBuffer(buffer, offset, useNumpy=False, filter=None):
+        """Loads a cast node from the given buffer at offset, returns the node and the offset following it."""
+        root = None
+
+        # Each open node is [node, remaining children, end offset, filter for its children].
+        nodes = []
+
+        # Properties with large codec payloads being decoded in the shared decode pool.
+        pending = []
+
+        nodeFilter = filter
+
+        while True:
+            header = castNodeHeader.unpack_from(buffer, offset)
+            end = offset + header[1]
+            offset += 0x18
+
+            node = CastNode.loadNode(header[0], header[2])
+
+            # Nodes on the way to the included types are kept without their properties.
+            if header[3] and nodeFilter is not None and not nodeFilter.includesProperties(header[0]):
+                for i in range(header[3]):
+                    offset = CastProperty.skipBuffer(buffer, offset)
+            elif header[3]:
+                # Small properties are kept packed, as they're stored, until they're read or modified.
+                if not useNumpy and (nodeFilter is None or nodeFilter.properties is None):
+                    packedEnd = castPackedEnd(buffer, offset, header[3])
+                else:
+                    packedEnd = None
+
+                if packedEnd is not None:
+                    node._properties = castBytes(buffer[offset:packedEnd])
+                    offset = packedEnd
+                else:
+                    properties = node._properties = {}
+
+                    for i in range(header[3]):
+                        if nodeFilter is not None and not nodeFilter.includesProperty(buffer, offset):
+                            offset = CastProperty.skipBuffer(buffer, offset)
+                            continue
+
+                        prop = CastProperty()
+                        offset = prop.loadBuffer(buffer, offset, useNumpy, pending)
+                        properties[prop.name] = prop
+
+            if header[4]:
+                node._childNodes = []
+
+            if nodes:
+                node.parentNode = nodes[-1][0]
+                node.parentNode._childNodes.append(node)
+            else:
+                root = node
+
+            if nodeFilter is not None:
+                nodes.append([node, header[4], end, nodeFilter.childFilter(header[0])])
+            else:
+                nodes.append([node, header[4], end, None])
+
+            # Move to the next child to load, closing any finished nodes.
+            while nodes:
+                top = nodes[-1]
+
+                if top[1] == 0:
+                    nodes.pop()
+
+                    # Skipped data at the end of the node isn't walked, so rely on the node size.
+                    if filter is not None:
+                        offset = top[2]
+                    continue
+
+                top[1] -= 1
+                nodeFilter = top[3]
+
+                if nodeFilter is not None and not nodeFilter.includesNode(buffer, offset):
+                    offset += castNodeHeader.unpack_from(buffer, offset)[1]
+                    continue
+                break
+
+            if not nodes:
+                castJoinPayloads(pending)
+                return (root, offset)
+
+    @staticmethod
+    def loadNode(identifier, hash):
+        """Creates an empty node of the type for the given identifier with an existing hash, without allocating one."""
+        nodeType = typeSwitcher.get(identifier, typeSwitcher[None])
+
+        node = nodeType.__new__(nodeType)
+        node._childNodes = castEmptyChildNodes
+        node._childHashes = None
+        node._childTypes = None
+        node._properties = castEmptyProperties
+        node._source = None
+        node.identifier = identifier
+        node._hash = hash
+        node.parentNode = None
+
+        return node
+
+    @staticmethod
+    def loadLazy(buffer, offset, useNumpy=False, filter=None, flags=0):
+        """Loads a cast node header from the given buffer, deferring properties and children until accessed.
+
+        The flags are those from the header of the file the buffer holds."""
+        header = castNodeHeader.unpack_from(buffer, offset)
+
+        node = CastNode.loadNode(header[0], header[2])
+        node._properties = None
+        node._childNodes = None
+        node._source = (buffer, offset, useNumpy, filter, flags)
+
+        return node
+
+    def _verbatim(self, codecs):
+        """Returns whether this lazy node was never accessed, and can be written as is with the given codec policy."""
+        source = self._source
+
+        if self._properties is not None or self._childNodes is not None or source is None or source[3] is not None:
+            return False
+
+        # Payloads in the buffer may be stored through codecs, which only match the policy of the file they came from.
+        return codecs is None and not source[4] & castFileCodecs
+
+    def _loadProperties(self):
+        """Decodes the properties of a lazily loaded node."""
+        if self._source is None:
+            raise Exception("The cast file this node was lazily loaded from is closed")
+
+        buffer, offset, useNumpy, filter, flags = self._source
+        header = castNodeHeader.unpack_from(buffer, offset)
+        offset += 0x18
+
+        properties = {}
+        pending = []
+
+        # Nodes on the way to the included types are kept without their properties.
+        if filter is None or filter.includesProperties(header[0]):
+            count = header[3]
+        else:
+            count = 0
+
+        if not useNumpy and (filter is None or filter.properties is None) and count:
+            end = castPackedEnd(buffer, offset, count)
+        else:
+            end = None
+
+        if end is not None:
+            properties = castBytes(buffer[offset:end])
         else:
-            node = typeSwitcher[None]()
+            for i in range(count):
+                if filter is not None and not filter.includesProperty(buffer, offset):
+                    offset = CastProperty.skipBuffer(buffer, offset)
+                    continue
+
+                prop = CastProperty()
+                offset = prop.loadBuffer(buffer, offset, useNumpy, pending)
+                properties[prop.name] = prop
 
-        node.identifier = header[0]
-        node.childNodes = [None] * header[4]
-        node.hash = header[2]
+            castJoinPayloads(pending)
+
+        if not properties:
+            properties = castEmptyProperties
+
+        self._properties = properties
+
+        if self._childNodes is not None:
+            self._source = None
+
+    def _loadChildren(self):
+        """Creates lazy nodes for the children of a lazily loaded node, skipping their subtrees using the node size."""
+        if self._source is None:
+            raise Exception("The cast file this node was lazily loaded from is closed")
+
+        buffer, offset, useNumpy, filter, flags = self._source
+        header = castNodeHeader.unpack_from(buffer, offset)
+        offset += 0x18
 
         for i in range(header[3]):
-            prop = CastProperty(file)
-            node.properties[prop.name] = prop
+            offset = CastProperty.skipBuffer(buffer, offset)
+
+        childNodes = []
+
+        if not header[4]:
+            childNodes = castEmptyChildNodes
+
+        if filter is not None:
+            filter = filter.childFilter(header[0])
+
         for i in range(header[4]):
-            node.childNodes[i] = CastNode.load(file)
-            node.childNodes[i].parentNode = node
+            if filter is None or filter.includesNode(buffer, offset):
+                child = CastNode.loadLazy(buffer, offset, useNumpy, filter, flags)
+                child.parentNode = self
+                childNodes.append(child)
 
-        return node
+            offset += castNodeHeader.unpack_from(buffer, offset)[1]
 
-    def save(self, file):
-        """Saves this cast node to the given file."""
-        file.write(struct.pack("IIQII",
-                               self.identifier,
-                               self.length(),
-                               self.hash,
-                               len(self.properties),
-                               len(self.childNodes)))
-
-        for property in self.properties.values():
-            property.save(file)
-        for childNode in self.childNodes:
-            childNode.save(file)
-
-    def length(self):
-        """Returns the length in bytes of this cast node."""
-        result = 0x18
-
-        for property in self.properties.values():
-            result += property.length()
-        for childNode in self.childNodes:
-            result += childNode.length()
+        self._childNodes = childNodes
 
-        return result
+        if self._properties is not None:
+            self._source = None
+
+    def save(self, file, lengths=None, codecs=None):
+        """Saves this cast node to the given file, storing property payloads through the given codec policy when set.
+
+        Lengths measured up front with the same codec policy may be given, they hold the encoded payloads too."""
+        # Measure the whole subtree once up front, instead of once per node.
+        if lengths is None:
+            lengths = {}
+            self.length(lengths, codecs)
+
+        # Small writes are accumulated and written in large chunks.
+        buffer = bytearray()
+        nodes = [self]
+
+        while nodes:
+            node = nodes.pop()
+            properties = node._properties
+            childNodes = node._childNodes
+
+            if properties is None or childNodes is None:
+                # A lazy node that was never accessed can't have been modified.
+                if node._verbatim(codecs):
+                    source, offset = node._source[0], node._source[1]
+                    castWriteBuffered(file, buffer,
+                                      castSlice(source, offset, offset + lengths[node]))
+                    continue
+
+                if properties is None:
+                    node._loadProperties()
+                properties = node._properties
+                childNodes = node.children()
+
+            packed = properties.__class__ is bytes
+
+            buffer += castNodeHeader.pack(node.identifier,
+                                          lengths[node],
+                                          node._hash,
+                                          castPackedCount(properties) if packed else len(properties),
+                                          len(childNodes))
+
+            if packed:
+                buffer += properties
+            else:
+                for property in properties.values():
+                    property.save(file, buffer, lengths.get(property))
+
+            if len(buffer) >= castWriteBufferSize:
+                file.write(buffer)
+                del buffer[:]
+
+            if childNodes:
+                nodes.extend(reversed(childNodes))
+
+        if buffer:
+            file.write(buffer)
+
+    def length(self, lengths=None, codecs=None):
+        """Returns the length in bytes of this cast node, optionally recording the length of each node in the subtree.
+
+        When a codec policy is given, the encoded payload of each property stored through a codec is recorded too."""
+        codecs = castCodecPolicy(codecs)
+
+        if lengths is None:
+            lengths = {}
+
+        # Walk the subtree parent first, then measure it in reverse, so children are measured before parents.
+        order = []
+        nodes = [self]
+
+        while nodes:
+            node = nodes.pop()
+            order.append(node)
+
+            if node._childNodes is None and node._verbatim(codecs):
+                continue
+
+            childNodes = node.children()
+
+            if childNodes:
+                nodes.extend(childNodes)
+
+        for node in reversed(order):
+            properties = node._properties
+            childNodes = node._childNodes
+
+            if properties is None or childNodes is None:
+                if node._verbatim(codecs):
+                    buffer, offset = node._source[0], node._source[1]
+                    lengths[node] = castNodeHeader.unpack_from(buffer, offset)[1]
+                    continue
+
+                if properties is None:
+                    node._loadProperties()
+                properties = node._properties
+                childNodes = node.children()
+
+            result = 0x18
+
+            # Packed payloads are smaller than any codec policy stores through a codec by default.
+            if properties.__class__ is bytes:
+                if codecs is None or codecs.minimumSize >= castLazyPropertySize:
+                    for childNode in childNodes:
+                        result += lengths[childNode]
+
+                    lengths[node] = result + len(properties)
+                    continue
+
+                properties = node.properties
+
+            for property in properties.values():
+                encoded = property.encode(codecs) if codecs is not None else None
+
+                if encoded is not None:
+                    lengths[property] = encoded
+
+                result += property.length(encoded)
+            for childNode in childNodes:
+                result += lengths[childNode]
+
+            lengths[node] = result
+
+        return lengths[self]
 
 
 class Model(CastNode):
     """A 3d model with meshes, materials, and a skeleton."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Model, self).__init__(0x6C646F6D)
 
     def Name(self):
         """The name of this model."""
-        n = self.properties.get("n")
+        n = self._property("n")
         if n is not None:
             return n.values[0]
         return None
 
     def SetName(self, name):
         """Sets the name of this model."""
-        self.CreateProperty("n", "s").values = [name]
+        self._setProperty("n", "s", [name])
 
     def Position(self):
         """The position of this model."""
-        position = self.properties.get("p")
+        position = self._property("p")
         if position is not None:
             return position.values
         return None
 
     def SetPosition(self, position):
         """Sets the position of this model."""
-        self.CreateProperty("p", "3v").values = list(position)
+        self._setProperty("p", "3v", list(position))
 
     def Rotation(self):
         """The rotation of this model."""
-        rotation = self.properties.get("r")
+        rotation = self._property("r")
         if rotation is not None:
             return rotation.values
         return None
 
     def SetRotation(self, rotation):
         """Sets the rotation of this model."""
-        self.CreateProperty("r", "4v").values = list(rotation)
+        self._setProperty("r", "4v", list(rotation))
 
     def Scale(self):
         """The scale of this model."""
-        scale = self.properties.get("s")
+        scale = self._property("s")
         if scale is not None:
             return scale.values
         return None
 
     def SetScale(self, scale):
         """Sets the scale of this model."""
-        self.CreateProperty("s", "3v").values = list(scale)
+        self._setProperty("s", "3v", list(scale))
 
     def Skeleton(self):
         """The skeleton embedded in this model."""
@@ -379,19 +2011,21 @@ class Model(CastNode):
 class Animation(CastNode):
     """A 3d animation and it's collection of curves."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Animation, self).__init__(0x6D696E61)
 
     def Name(self):
         """The name of this animation."""
-        n = self.properties.get("n")
+        n = self._property("n")
         if n is not None:
             return n.values[0]
         return None
 
     def SetName(self, name):
         """Sets the name of this animation."""
-        self.CreateProperty("n", "s").values = [name]
+        self._setProperty("n", "s", [name])
 
     def Skeleton(self):
         """The skeleton embedded in this animation."""
@@ -427,18 +2061,18 @@ class Animation(CastNode):
 
     def Framerate(self):
         """The framerate this animation plays at."""
-        fr = self.properties.get("fr")
+        fr = self._property("fr")
         if fr is not None:
             return fr.values[0]
         return None
 
     def SetFramerate(self, framerate):
         """Sets the framerate this animation plays at."""
-        self.CreateProperty("fr", "f").values = [framerate]
+        self._setProperty("fr", "f", [framerate])
 
     def Looping(self):
         """Whether or not this animation should loop."""
-        lo = self.properties.get("lo")
+        lo = self._property("lo")
         if lo is not None:
             return lo.values[0] >= 1
         return False
@@ -446,125 +2080,127 @@ class Animation(CastNode):
     def SetLooping(self, enabled):
         """Sets whether or not this animation should loop."""
         if enabled:
-            self.CreateProperty("lo", "b").values = [1]
+            self._setProperty("lo", "b", [1])
         else:
-            self.CreateProperty("lo", "b").values = [0]
+            self._setProperty("lo", "b", [0])
 
 
 class Curve(CastNode):
     """A curve from an animation that animates a node's property."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Curve, self).__init__(0x76727563)
 
     def NodeName(self):
         """The name of the node to animate."""
-        nn = self.properties.get("nn")
+        nn = self._property("nn")
         if nn is not None:
             return nn.values[0]
         return None
 
     def SetNodeName(self, name):
         """Sets the name of the node to animate."""
-        self.CreateProperty("nn", "s").values = [name]
+        self._setProperty("nn", "s", [name])
 
     def KeyPropertyName(self):
         """The property of the node to animate."""
-        kp = self.properties.get("kp")
+        kp = self._property("kp")
         if kp is not None:
             return kp.values[0]
         return None
 
     def SetKeyPropertyName(self, name):
         """Sets the property of the node to animate."""
-        self.CreateProperty("kp", "s").values = [name]
+        self._setProperty("kp", "s", [name])
 
     def KeyFrameBuffer(self):
         """The collection of keyframes."""
-        kb = self.properties.get("kb")
+        kb = self._property("kb")
         if kb is not None:
-            return kb.values
+            return kb.buffer()
         return None
 
     def SetKeyFrameBuffer(self, values):
         """Sets the collection of keyframes."""
-        self.CreateProperty("kb",
-                            castTypeForMaximum(values)).values = list(values)
+        self._setProperty("kb", castTypeForMaximum(values), castValues(values))
 
     def KeyValueBuffer(self):
         """The collection of keyframe values."""
-        kv = self.properties.get("kv")
+        kv = self._property("kv")
         if kv is not None:
-            return kv.values
+            return kv.buffer()
         return None
 
     def SetFloatKeyValueBuffer(self, values):
         """Sets the collection of keyframe values as a collection of floats."""
-        self.CreateProperty("kv", "f").values = list(values)
+        self._setProperty("kv", "f", castValues(values))
 
     def SetVec4KeyValueBuffer(self, values):
         """Sets the collection of keyframe values as a collection of vec4s."""
-        self.CreateProperty("kv", "4v").values = \
-            list(itertools.chain.from_iterable(values))
+        self._setProperty("kv", "4v", castFlatValues(values))
 
     def SetByteKeyValueBuffer(self, values):
         """Sets the collection of keyframe values as a collection of bytes."""
-        self.CreateProperty("kv", "b").values = list(values)
+        self._setProperty("kv", "b", castValues(values))
 
     def Mode(self):
         """The mode for this animation."""
-        m = self.properties.get("m")
+        m = self._property("m")
         if m is not None:
             return m.values[0]
         return None
 
     def SetMode(self, mode):
         """Sets the mode for this animation."""
-        self.CreateProperty("m", "s").values = [mode]
+        self._setProperty("m", "s", [mode])
 
     def AdditiveBlendWeight(self):
         """The weight to use when blending this animation."""
-        ab = self.properties.get("ab")
+        ab = self._property("ab")
         if ab is not None:
             return ab.values[0]
         return 1.0
 
     def SetAdditiveBlendWeight(self, value):
         """Sets the weight to use when blending this animation."""
-        self.CreateProperty("ab", "f").values = [value]
+        self._setProperty("ab", "f", [value])
 
 
 class CurveModeOverride(CastNode):
     """An override for an animation curves mode."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(CurveModeOverride, self).__init__(0x564F4D43)
 
     def NodeName(self):
         """The name of the node that is the start of this override."""
-        nn = self.properties.get("nn")
+        nn = self._property("nn")
         if nn is not None:
             return nn.values[0]
         return None
 
     def SetNodeName(self, name):
         """Sets the name of the node that is the start of this override."""
-        self.CreateProperty("nn", "s").values = [name]
+        self._setProperty("nn", "s", [name])
 
     def Mode(self):
         """The mode for this override."""
-        m = self.properties.get("m")
+        m = self._property("m")
         if m is not None:
             return m.values[0]
         return None
 
     def SetMode(self, mode):
         """Sets the mode for this override."""
-        self.CreateProperty("m", "s").values = [mode]
+        self._setProperty("m", "s", [mode])
 
     def OverrideTranslationCurves(self):
         """Whether or not the override effects translations."""
-        ot = self.properties.get("ot")
+        ot = self._property("ot")
         if ot is not None:
             return ot.values[0] >= 1
         return False
@@ -572,13 +2208,13 @@ class CurveModeOverride(CastNode):
     def SetOverrideTranslationCurves(self, enabled):
         """Sets whether or not the override effects translations."""
         if enabled:
-            self.CreateProperty("ot", "b").values = [1]
+            self._setProperty("ot", "b", [1])
         else:
-            self.CreateProperty("ot", "b").values = [0]
+            self._setProperty("ot", "b", [0])
 
     def OverrideRotationCurves(self):
         """Whether or not the override effects rotations."""
-        orr = self.properties.get("or")
+        orr = self._property("or")
         if orr is not None:
             return orr.values[0] >= 1
         return False
@@ -586,13 +2222,13 @@ class CurveModeOverride(CastNode):
     def SetOverrideRotationCurves(self, enabled):
         """Sets whether or not the override effects rotations."""
         if enabled:
-            self.CreateProperty("or", "b").values = [1]
+            self._setProperty("or", "b", [1])
         else:
-            self.CreateProperty("or", "b").values = [0]
+            self._setProperty("or", "b", [0])
 
     def OverrideScaleCurves(self):
         """Whether or not the override effects scales."""
-        os = self.properties.get("os")
+        os = self._property("os")
         if os is not None:
             return os.values[0] >= 1
         return False
@@ -600,193 +2236,231 @@ class CurveModeOverride(CastNode):
     def SetOverrideScaleCurves(self, enabled):
         """Sets whether or not the override effects scales."""
         if enabled:
-            self.CreateProperty("os", "b").values = [1]
+            self._setProperty("os", "b", [1])
         else:
-            self.CreateProperty("os", "b").values = [0]
+            self._setProperty("os", "b", [0])
 
 
 class NotificationTrack(CastNode):
     """The notification track for an animation."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(NotificationTrack, self).__init__(0x6669746E)
 
     def Name(self):
         """The name of the notification."""
-        n = self.properties.get("n")
+        n = self._property("n")
         if n is not None:
             return n.values[0]
         return None
 
     def SetName(self, name):
         """Sets the name of the notification."""
-        self.CreateProperty("n", "s").values = [name]
+        self._setProperty("n", "s", [name])
 
     def KeyFrameBuffer(self):
         """A collection of keyframes this notification fires on."""
-        kb = self.properties.get("kb")
+        kb = self._property("kb")
         if kb is not None:
             return kb.values
         return None
 
     def SetKeyFrameBuffer(self, values):
         """Sets the collection of keyframes this notification fires on."""
-        self.CreateProperty("kb",
-                            castTypeForMaximum(values)).values = list(values)
+        self._setProperty("kb", castTypeForMaximum(values), castValues(values))
 
 
 class Mesh(CastNode):
     """A 3d mesh for a model."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Mesh, self).__init__(0x6873656D)
 
     def Name(self):
         """The name of this mesh."""
-        n = self.properties.get("n")
+        n = self._property("n")
         if n is not None:
             return n.values[0]
         return None
 
     def SetName(self, name):
         """Sets the name of this mesh."""
-        self.CreateProperty("n", "s").values = [name]
+        self._setProperty("n", "s", [name])
 
     def VertexCount(self):
         """Gets the number of vertices in this mesh."""
-        vp = self.properties.get("vp")
+        vp = self._property("vp")
         if vp is not None:
-            return int(len(vp.values) / 3)
+            if vp.isType("h"):
+                return vp.arrayLength() // 3
+            return vp.arrayLength()
 
     def FaceCount(self):
         """Gets the number of faces in this mesh."""
-        f = self.properties.get("f")
+        f = self._property("f")
         if f is not None:
             return int(len(f.values) / 3)
 
     def UVLayerCount(self):
         """Gets the number of uv layers in this mesh."""
-        ul = self.properties.get("ul")
+        ul = self._property("ul")
         if ul is not None:
             return ul.values[0]
         return 0
 
     def SetUVLayerCount(self, count):
         """Sets the number of uv layers in this mesh."""
-        self.CreateProperty("ul", "b").values = [count]
+        self._setProperty("ul", "b", [count])
 
     def ColorLayerCount(self):
         """Gets the number of color layers in this mesh."""
-        cl = self.properties.get("cl")
+        cl = self._property("cl")
         if cl is not None:
             return cl.values[0]
 
         # Check for old cast vertex color format.
         # If it exists, always return 1 layer.
-        if "vc" in self.properties:
+        if self._property("vc") is not None:
             return 1
         else:
             return 0
 
     def SetColorLayerCount(self, count):
         """Sets the number of color layers in this mesh."""
-        self.CreateProperty("cl", "b").values = [count]
+        self._setProperty("cl", "b", [count])
 
     def MaximumWeightInfluence(self):
         """The maximum weight influence for this mesh."""
-        mi = self.properties.get("mi")
+        mi = self._property("mi")
         if mi is not None:
             return mi.values[0]
         return 0
 
     def SetMaximumWeightInfluence(self, maximum):
         """Sets the maximum weight influence for this mesh."""
-        self.CreateProperty("mi", "b").values = [maximum]
+        self._setProperty("mi", "b", [maximum])
 
     def SkinningMethod(self):
         """The skinning method used for this mesh."""
-        sm = self.properties.get("sm")
+        sm = self._property("sm")
         if sm is not None:
             return sm.values[0]
         return "linear"
 
     def SetSkinningMethod(self, method):
         """Sets the skinning method used for this mesh."""
-        self.CreateProperty("sm", "s").values = [method]
+        self._setProperty("sm", "s", [method])
 
     def FaceBuffer(self):
         """The collection of faces for this mesh."""
-        f = self.properties.get("f")
+        f = self._property("f")
         if f is not None:
-            return f.values
+            return f.buffer()
         return None
 
     def SetFaceBuffer(self, values):
         """Sets the collection of faces for this mesh."""
-        self.CreateProperty("f",
-                            castTypeForMaximum(values)).values = list(values)
+        self._setProperty("f", castTypeForMaximum(values), castValues(values))
 
     def VertexPositionBuffer(self):
-        """The collection of vertex positions for this mesh."""
-        vp = self.properties.get("vp")
+        """The collection of vertex positions for this mesh, dequantized when they're stored quantized."""
+        vp = self._property("vp")
         if vp is not None:
-            return vp.values
+            if vp.isType("h"):
+                return castDequantizeBounded(vp.values, self._property("vpb"), 3)
+            return vp.buffer()
         return None
 
-    def SetVertexPositionBuffer(self, values):
-        """Sets the collection of vertex positions for this mesh."""
-        self.CreateProperty("vp", "3v").values = \
-            list(itertools.chain.from_iterable(values))
+    def SetVertexPositionBuffer(self, values, quantize=None):
+        """Sets the collection of vertex positions for this mesh, returns the maximum quantization error.
+
+        When quantize is "unorm16", positions are stored as shorts against their bounding box."""
+        self._removeProperty("vpb")
+
+        if quantize is None:
+            self._setProperty("vp", "3v", castFlatValues(values))
+            return 0.0
+        elif quantize == "unorm16":
+            values, bounds, error = castQuantizeBounded(castFlatValues(values), 3)
+
+            self._setProperty("vp", "h", values)
+            self._setProperty("vpb", "3v", bounds)
+            return error
+
+        raise Exception("Unsupported vertex position quantization: %s" % quantize)
 
     def VertexNormalBuffer(self):
-        """The collection of vertex normals for this mesh."""
-        vn = self.properties.get("vn")
+        """The collection of vertex normals for this mesh, decoded when they're stored octahedral."""
+        vn = self._property("vn")
         if vn is not None:
-            return vn.values
+            if vn.isType("h") or vn.isType("b"):
+                return castDecodeOctahedral(vn.values, vn.type.identifier)
+            return vn.buffer()
         return None
 
-    def SetVertexNormalBuffer(self, values):
-        """Sets the collection of vertex normals for this mesh."""
-        self.CreateProperty("vn", "3v").values = \
-            list(itertools.chain.from_iterable(values))
+    def SetVertexNormalBuffer(self, values, quantize=None):
+        """Sets the collection of vertex normals for this mesh, returns the maximum quantization error.
+
+        When quantize is "oct16" or "oct8", normals are stored octahedral in two shorts or bytes."""
+        return self._setDirections("vn", values, quantize)
 
     def VertexTangentBuffer(self):
-        """The collection of vertex tangents for this mesh."""
-        vt = self.properties.get("vt")
+        """The collection of vertex tangents for this mesh, decoded when they're stored octahedral."""
+        vt = self._property("vt")
         if vt is not None:
-            return vt.values
+            if vt.isType("h") or vt.isType("b"):
+                return castDecodeOctahedral(vt.values, vt.type.identifier)
+            return vt.buffer()
         return None
 
-    def SetVertexTangentBuffer(self, values):
-        """Sets the collection of vertex tangents for this mesh."""
-        self.CreateProperty("vt", "3v").values = \
-            list(itertools.chain.from_iterable(values))
+    def SetVertexTangentBuffer(self, values, quantize=None):
+        """Sets the collection of vertex tangents for this mesh, returns the maximum quantization error.
+
+        When quantize is "oct16" or "oct8", tangents are stored octahedral in two shorts or bytes."""
+        return self._setDirections("vt", values, quantize)
+
+    def _setDirections(self, name, values, quantize):
+        """Sets a collection of direction vectors, optionally stored octahedral, returns the maximum quantization error."""
+        if quantize is None:
+            self._setProperty(name, "3v", castFlatValues(values))
+            return 0.0
+        elif quantize in ("oct16", "oct8"):
+            type = "h" if quantize == "oct16" else "b"
+            values, error = castEncodeOctahedral(castFlatValues(values), type)
+
+            self._setProperty(name, type, values)
+            return error
+
+        raise Exception("Unsupported vertex direction quantization: %s" % quantize)
 
     def VertexColorLayerBuffer(self, index):
         """The vertex color layer collection for the given layer index."""
-        cl = self.properties.get("c%d" % index)
+        cl = self._property("c%d" % index)
         if cl is not None:
-            return cl.values
+            return cl.buffer()
 
         # Support old cast vertex color specification.
         # If the user asks for index[0], return the original vertex colors.
         if index == 0:
-            vc = self.properties.get("vc")
+            vc = self._property("vc")
             if vc is not None:
-                return vc.values
+                return vc.buffer()
         return None
 
     def SetVertexColorBuffer(self, index, values):
         """Sets the vertex color layer collection for the given layer index."""
-        if values and isinstance(values[0], int):
-            self.CreateProperty("c%d" % index, "i").values = list(values)
+        if castIsIntegral(values):
+            self._setProperty("c%d" % index, "i", castValues(values))
         else:
-            self.CreateProperty("c%d" % index, "4v").values = \
-                list(itertools.chain.from_iterable(values))
+            self._setProperty("c%d" % index, "4v", castFlatValues(values))
 
     def VertexColorLayerBufferPacked(self, index):
         """Whether or not the vertex color layer is in packed integer format (CastColor) or floating point format."""
-        cl = self.properties.get("c%d" % index)
+        cl = self._property("c%d" % index)
         if cl is not None:
             return cl.isType("i")
 
@@ -795,178 +2469,214 @@ class Mesh(CastNode):
         return True
 
     def VertexUVLayerBuffer(self, index):
-        """The uv layer collection for the given layer index."""
-        ul = self.properties.get("u%d" % index)
+        """The uv layer collection for the given layer index, dequantized when it's stored quantized."""
+        ul = self._property("u%d" % index)
         if ul is not None:
-            return ul.values
+            if ul.isType("e"):
+                return castDequantizeHalf(ul.values, 2)
+            elif ul.isType("h"):
+                return castDequantizeBounded(ul.values, self._property("u%db" % index), 2)
+            return ul.buffer()
         return None
 
-    def SetVertexUVLayerBuffer(self, index, values):
-        """Sets the uv layer collection for the given layer index."""
-        self.CreateProperty("u%d" % index, "2v").values = \
-            list(itertools.chain.from_iterable(values))
+    def SetVertexUVLayerBuffer(self, index, values, quantize=None):
+        """Sets the uv layer collection for the given layer index, returns the maximum quantization error.
+
+        When quantize is "half", uvs are stored as half floats, and when it's "unorm16", they're stored as shorts
+        against their bounding box."""
+        self._removeProperty("u%db" % index)
+
+        if quantize is None:
+            self._setProperty("u%d" % index, "2v", castFlatValues(values))
+            return 0.0
+        elif quantize == "half":
+            values, error = castQuantizeHalf(castFlatValues(values))
+
+            self._setProperty("u%d" % index, "e", values)
+            return error
+        elif quantize == "unorm16":
+            values, bounds, error = castQuantizeBounded(castFlatValues(values), 2)
+
+            self._setProperty("u%d" % index, "h", values)
+            self._setProperty("u%db" % index, "2v", bounds)
+            return error
+
+        raise Exception("Unsupported vertex uv quantization: %s" % quantize)
 
     def VertexWeightBoneBuffer(self):
         """Gets the vertex weight bone index buffer."""
-        wb = self.properties.get("wb")
+        wb = self._property("wb")
         if wb is not None:
-            return wb.values
+            return wb.buffer()
         return None
 
     def SetVertexWeightBoneBuffer(self, values):
         """Sets the vertex weight bone index buffer."""
-        self.CreateProperty("wb",
-                            castTypeForMaximum(values)).values = list(values)
+        self._setProperty("wb", castTypeForMaximum(values), castValues(values))
 
     def VertexWeightValueBuffer(self):
         """Gets the vertex weight value buffer."""
-        wv = self.properties.get("wv")
+        wv = self._property("wv")
         if wv is not None:
-            return wv.values
+            return wv.buffer()
         return None
 
     def SetVertexWeightValueBuffer(self, values):
         """Sets the vertex weight value buffer."""
-        self.CreateProperty("wv", "f").values = list(values)
+        self._setProperty("wv", "f", castValues(values))
 
     def Material(self):
         """Gets the material used for this mesh."""
-        m = self.properties.get("m")
+        m = self._property("m")
         if m is not None:
             return self.parentNode.ChildByHash(m.values[0])
         return None
 
     def SetMaterial(self, hash):
         """Sets the material hash for this mesh."""
-        self.CreateProperty("m", "l").values = [hash]
+        self._setProperty("m", "l", [hash])
+
+    def References(self):
+        """The hashes this mesh links to, as a collection of (property name, hash, node to resolve in)."""
+        return castReferences(self, self.parentNode, ("m",))
 
 
 class Hair(CastNode):
     """A 3d hair definition for a model."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Hair, self).__init__(0x72696168)
 
     def Name(self):
         """The name of this hair."""
-        n = self.properties.get("n")
+        n = self._property("n")
         if n is not None:
             return n.values[0]
         return None
 
     def SetName(self, name):
         """Sets the name of this hair."""
-        self.CreateProperty("n", "s").values = [name]
+        self._setProperty("n", "s", [name])
 
     def StrandCount(self):
         """Gets the number of strands in this hair."""
-        se = self.properties.get("se")
+        se = self._property("se")
         if se is not None:
             return len(se.values)
 
     def SegmentsBuffer(self):
         """The number of segments for each strand in this hair."""
-        se = self.properties.get("se")
+        se = self._property("se")
         if se is not None:
-            return se.values
+            return se.buffer()
         return None
 
     def SetSegmentBuffer(self, values):
         """Sets the number of segments for each strand in this hair."""
-        self.CreateProperty("se",
-                            castTypeForMaximum(values)).values = list(values)
+        self._setProperty("se", castTypeForMaximum(values), castValues(values))
 
     def ParticleBuffer(self):
         """The collection of particles for this hair."""
-        pt = self.properties.get("pt")
+        pt = self._property("pt")
         if pt is not None:
-            return pt.values
+            return pt.buffer()
         return None
 
     def SetParticleBuffer(self, values):
         """Sets the collection of particles for this hair."""
-        self.CreateProperty("pt", "3v").values = \
-            list(itertools.chain.from_iterable(values))
+        self._setProperty("pt", "3v", castFlatValues(values))
 
     def Material(self):
         """Gets the material used for this hair."""
-        m = self.properties.get("m")
+        m = self._property("m")
         if m is not None:
             return self.parentNode.ChildByHash(m.values[0])
         return None
 
     def SetMaterial(self, hash):
         """Sets the material hash for this hair."""
-        self.CreateProperty("m", "l").values = [hash]
+        self._setProperty("m", "l", [hash])
+
+    def References(self):
+        """The hashes this hair links to, as a collection of (property name, hash, node to resolve in)."""
+        return castReferences(self, self.parentNode, ("m",))
 
 
 class BlendShape(CastNode):
     """A blend shape key that defines a base mesh shape, and corresponding target mesh values."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(BlendShape, self).__init__(0x68736C62)
 
     def Name(self):
         """The name of this blend shape."""
-        n = self.properties.get("n")
+        n = self._property("n")
         if n is not None:
             return n.values[0]
         return None
 
     def SetName(self, name):
         """Sets the name of this blend shape."""
-        self.CreateProperty("n", "s").values = [name]
+        self._setProperty("n", "s", [name])
 
     def BaseShape(self):
         """The base shape."""
-        b = self.properties.get("b")
+        b = self._property("b")
         if b is not None:
             return self.parentNode.ChildByHash(b.values[0])
         return None
 
     def SetBaseShape(self, hash):
         """Sets the base shape."""
-        self.CreateProperty("b", "l").values = [hash]
+        self._setProperty("b", "l", [hash])
 
     def TargetShapeVertexIndices(self):
         """A collection of target shape vertex indices."""
-        vi = self.properties.get("vi")
+        vi = self._property("vi")
         if vi is not None:
-            return vi.values
+            return vi.buffer()
         return None
 
     def SetTargetShapeVertexIndices(self, indices):
         """Sets a collection of target shape vertex indices."""
-        self.CreateProperty("vi",
-                            castTypeForMaximum(indices)).values = list(indices)
+        self._setProperty("vi", castTypeForMaximum(indices), castValues(indices))
 
     def TargetShapeVertexPositions(self):
         """A collection of target shape vertex positions."""
-        vp = self.properties.get("vp")
+        vp = self._property("vp")
         if vp is not None:
-            return vp.values
+            return vp.buffer()
         return None
 
     def SetTargetShapeVertexPositions(self, positions):
         """Sets a collection of target shape vertex positions."""
-        self.CreateProperty("vp", "3v").values = \
-            list(itertools.chain.from_iterable(positions))
+        self._setProperty("vp", "3v", castFlatValues(positions))
 
     def TargetWeightScale(self):
         """The target shape scale value."""
-        ts = self.properties.get("ts")
+        ts = self._property("ts")
         if ts is not None:
             return ts.values[0]
         return None
 
     def SetTargetWeightScale(self, scale):
         """Sets the target shape scale value."""
-        self.CreateProperty("ts", "f").values = [scale]
+        self._setProperty("ts", "f", [scale])
+
+    def References(self):
+        """The hashes this blend shape links to, as a collection of (property name, hash, node to resolve in)."""
+        return castReferences(self, self.parentNode, ("b",))
 
 
 class Skeleton(CastNode):
     """A collection of bones for a model or animation."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Skeleton, self).__init__(0x6C656B73)
 
@@ -998,23 +2708,25 @@ class Skeleton(CastNode):
 class Bone(CastNode):
     """A 3d bone that belongs to a skeleton."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Bone, self).__init__(0x656E6F62)
 
     def Name(self):
         """The name of this bone."""
-        name = self.properties.get("n")
+        name = self._property("n")
         if name is not None:
             return name.values[0]
         return None
 
     def SetName(self, name):
         """Sets the name of this bone."""
-        self.CreateProperty("n", "s").values = [name]
+        self._setProperty("n", "s", [name])
 
     def ParentIndex(self):
         """The index of the parent bone in the skeleton. -1 is a root bone."""
-        parent = self.properties.get("p")
+        parent = self._property("p")
         if parent is not None:
             # Since cast uses unsigned types, we must
             # convert to a signed integer, as the range is -1 - INT32_MAX
@@ -1026,13 +2738,13 @@ class Bone(CastNode):
     def SetParentIndex(self, index):
         """Sets the index of the parent bone in the skeleton. -1 is a root bone."""
         if index < 0:
-            self.CreateProperty("p", "i").values = [index + 2**32]
+            self._setProperty("p", "i", [index + 2**32])
         else:
-            self.CreateProperty("p", "i").values = [index]
+            self._setProperty("p", "i", [index])
 
     def SegmentScaleCompensate(self):
         """Whether or not children bones are effected by the scale of this bone."""
-        ssc = self.properties.get("ssc")
+        ssc = self._property("ssc")
         if ssc is not None:
             return ssc.values[0] >= 1
         return True
@@ -1040,152 +2752,154 @@ class Bone(CastNode):
     def SetSegmentScaleCompensate(self, enabled):
         """Sets whether or not children bones are effected by the scale of this bone."""
         if enabled:
-            self.CreateProperty("ssc", "b").values = [1]
+            self._setProperty("ssc", "b", [1])
         else:
-            self.CreateProperty("ssc", "b").values = [0]
+            self._setProperty("ssc", "b", [0])
 
     def LocalPosition(self):
         """The local space position of this bone."""
-        localPos = self.properties.get("lp")
+        localPos = self._property("lp")
         if localPos is not None:
             return localPos.values
         return None
 
     def SetLocalPosition(self, position):
         """Sets the local space position of this bone."""
-        self.CreateProperty("lp", "3v").values = list(position)
+        self._setProperty("lp", "3v", list(position))
 
     def LocalRotation(self):
         """The local space rotation of this bone."""
-        localRot = self.properties.get("lr")
+        localRot = self._property("lr")
         if localRot is not None:
             return localRot.values
         return None
 
     def SetLocalRotation(self, rotation):
         """Sets the local space rotation of this bone."""
-        self.CreateProperty("lr", "4v").values = list(rotation)
+        self._setProperty("lr", "4v", list(rotation))
 
     def WorldPosition(self):
         """The world position of this bone."""
-        worldPos = self.properties.get("wp")
+        worldPos = self._property("wp")
         if worldPos is not None:
             return worldPos.values
         return None
 
     def SetWorldPosition(self, position):
         """Sets the world position of this bone."""
-        self.CreateProperty("wp", "3v").values = list(position)
+        self._setProperty("wp", "3v", list(position))
 
     def WorldRotation(self):
         """The world rotation of this bone."""
-        worldRot = self.properties.get("wr")
+        worldRot = self._property("wr")
         if worldRot is not None:
             return worldRot.values
         return None
 
     def SetWorldRotation(self, rotation):
         """Sets the world rotation of this bone."""
-        self.CreateProperty("wr", "4v").values = list(rotation)
+        self._setProperty("wr", "4v", list(rotation))
 
     def Scale(self):
         """The scale of this bone."""
-        scale = self.properties.get("s")
+        scale = self._property("s")
         if scale is not None:
             return scale.values
         return None
 
     def SetScale(self, scale):
         """Sets the scale of this bone."""
-        self.CreateProperty("s", "3v").values = list(scale)
+        self._setProperty("s", "3v", list(scale))
 
 
 class IKHandle(CastNode):
     """Defines an ik chain and its constraints in the skeleton."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(IKHandle, self).__init__(0x64686B69)
 
     def Name(self):
         """The name of this ik handle."""
-        name = self.properties.get("n")
+        name = self._property("n")
         if name is not None:
             return name.values[0]
         return None
 
     def SetName(self, name):
         """Sets the name for this ik handle."""
-        self.CreateProperty("n", "s").values = [name]
+        self._setProperty("n", "s", [name])
 
     def StartBone(self):
         """The bone which starts the chain."""
-        sb = self.properties.get("sb")
+        sb = self._property("sb")
         if sb is not None:
             return self.parentNode.ChildByHash(sb.values[0])
         return None
 
     def SetStartBone(self, hash):
         """Sets the bone which starts the chain."""
-        self.CreateProperty("sb", "l").values = [hash]
+        self._setProperty("sb", "l", [hash])
 
     def EndBone(self):
         """The bone which ends the chain."""
-        eb = self.properties.get("eb")
+        eb = self._property("eb")
         if eb is not None:
             return self.parentNode.ChildByHash(eb.values[0])
         return None
 
     def SetEndBone(self, hash):
         """Sets the bone which ends the chain."""
-        self.CreateProperty("eb", "l").values = [hash]
+        self._setProperty("eb", "l", [hash])
 
     def TargetBone(self):
         """The bone that acts as a target for the chain."""
-        tb = self.properties.get("tb")
+        tb = self._property("tb")
         if tb is not None:
             return self.parentNode.ChildByHash(tb.values[0])
         return None
 
     def SetTargetBone(self, hash):
         """Sets the bone that acts as a target for the chain."""
-        self.CreateProperty("tb", "l").values = [hash]
+        self._setProperty("tb", "l", [hash])
 
     def TargetOffset(self):
         """An offset to apply to the target."""
-        to = self.properties.get("to")
+        to = self._property("to")
         if to is not None:
             return to.values
         return None
 
     def SetTargetOffset(self, offset):
         """Sets an offset to apply to the target."""
-        self.CreateProperty("to", "3v").values = list(offset)
+        self._setProperty("to", "3v", list(offset))
 
     def PoleVectorBone(self):
         """The bone that acts as a pole vector for this chain."""
-        pv = self.properties.get("pv")
+        pv = self._property("pv")
         if pv is not None:
             return self.parentNode.ChildByHash(pv.values[0])
         return None
 
     def SetPoleVectorBone(self, hash):
         """Sets the bone that acts as a pole vector for this chain."""
-        self.CreateProperty("pv", "l").values = [hash]
+        self._setProperty("pv", "l", [hash])
 
     def PoleBone(self):
         """The bone that acts as the pole (twist) for this chain."""
-        pb = self.properties.get("pb")
+        pb = self._property("pb")
         if pb is not None:
             return self.parentNode.ChildByHash(pb.values[0])
         return None
 
     def SetPoleBone(self, hash):
         """Sets the bone that acts as the pole (twist) for this chain."""
-        self.CreateProperty("pb", "l").values = [hash]
+        self._setProperty("pb", "l", [hash])
 
     def UseTargetRotation(self):
         """Whether or not the target rotation effects the chain."""
-        tr = self.properties.get("tr")
+        tr = self._property("tr")
         if tr is not None:
             return tr.values[0] >= 1
         return False
@@ -1193,64 +2907,70 @@ class IKHandle(CastNode):
     def SetUseTargetRotation(self, enabled):
         """Sets whether or not the target rotation effects the chain."""
         if enabled:
-            self.CreateProperty("tr", "b").values = [1]
+            self._setProperty("tr", "b", [1])
         else:
-            self.CreateProperty("tr", "b").values = [0]
+            self._setProperty("tr", "b", [0])
+
+    def References(self):
+        """The hashes this ik handle links to, as a collection of (property name, hash, node to resolve in)."""
+        return castReferences(self, self.parentNode, ("sb", "eb", "tb", "pv", "pb"))
 
 
 class Constraint(CastNode):
     """Defines a bone constraint in a skeleton."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Constraint, self).__init__(0x74736E63)
 
     def Name(self):
         """The name of this constraint."""
-        name = self.properties.get("n")
+        name = self._property("n")
         if name is not None:
             return name.values[0]
         return None
 
     def SetName(self, name):
         """Sets the name for this constraint."""
-        self.CreateProperty("n", "s").values = [name]
+        self._setProperty("n", "s", [name])
 
     def ConstraintType(self):
         """The type of constraint to configure."""
-        ct = self.properties.get("ct")
+        ct = self._property("ct")
         if ct is not None:
             return ct.values[0]
         return None
 
     def SetConstraintType(self, type):
         """Sets the type of constraint to configure."""
-        self.CreateProperty("ct", "s").values = [type]
+        self._setProperty("ct", "s", [type])
 
     def ConstraintBone(self):
         """The bone that is being constrained."""
-        cb = self.properties.get("cb")
+        cb = self._property("cb")
         if cb is not None:
             return self.parentNode.ChildByHash(cb.values[0])
         return None
 
     def SetConstraintBone(self, hash):
         """Sets the bone that is being constrained."""
-        self.CreateProperty("cb", "l").values = [hash]
+        self._setProperty("cb", "l", [hash])
 
     def TargetBone(self):
         """The bone that is the target for the constraint."""
-        tb = self.properties.get("tb")
+        tb = self._property("tb")
         if tb is not None:
             return self.parentNode.ChildByHash(tb.values[0])
         return None
 
     def SetTargetBone(self, hash):
         """Sets the bone that is the target for the constraint."""
-        self.CreateProperty("tb", "l").values = [hash]
+        self._setProperty("tb", "l", [hash])
 
     def MaintainOffset(self):
         """Whether or not the original offset is maintained."""
-        mo = self.properties.get("mo")
+        mo = self._property("mo")
         if mo is not None:
             return mo.values[0] >= 1
         return False
@@ -1258,13 +2978,13 @@ class Constraint(CastNode):
     def SetMaintainOffset(self, enabled):
         """Sets whether or not the original offset is maintained."""
         if enabled:
-            self.CreateProperty("mo", "b").values = [1]
+            self._setProperty("mo", "b", [1])
         else:
-            self.CreateProperty("mo", "b").values = [0]
+            self._setProperty("mo", "b", [0])
 
     def CustomOffset(self):
         """A custom offset for the constraint."""
-        co = self.properties.get("co")
+        co = self._property("co")
         if co is not None:
             return co.values
         return None
@@ -1274,24 +2994,24 @@ class Constraint(CastNode):
         length = len(offset)
 
         if length == 3:
-            self.CreateProperty("co", "3v").values = list(offset)
+            self._setProperty("co", "3v", list(offset))
         elif length == 4:
-            self.CreateProperty("co", "4v").values = list(offset)
+            self._setProperty("co", "4v", list(offset))
 
     def Weight(self):
         """Gets the weight of influence this constraint has."""
-        wt = self.properties.get("wt")
+        wt = self._property("wt")
         if wt is not None:
             return wt.values[0]
         return 1.0
 
     def SetWeight(self, weight):
         """Sets the weight of influence this constraint has."""
-        self.CreateProperty("wt", "f").values = [weight]
+        self._setProperty("wt", "f", [weight])
 
     def SkipX(self):
         """Whether or not to skip the x axis when constraining."""
-        sx = self.properties.get("sx")
+        sx = self._property("sx")
         if sx is not None:
             return sx.values[0] >= 1
         return False
@@ -1299,13 +3019,13 @@ class Constraint(CastNode):
     def SetSkipX(self, enabled):
         """Sets whether or not to skip the x axis when constraining."""
         if enabled:
-            self.CreateProperty("sx", "b").values = [1]
+            self._setProperty("sx", "b", [1])
         else:
-            self.CreateProperty("sx", "b").values = [0]
+            self._setProperty("sx", "b", [0])
 
     def SkipY(self):
         """Whether or not to skip the y axis when constraining."""
-        sy = self.properties.get("sy")
+        sy = self._property("sy")
         if sy is not None:
             return sy.values[0] >= 1
         return False
@@ -1313,13 +3033,13 @@ class Constraint(CastNode):
     def SetSkipY(self, enabled):
         """Sets whether or not to skip the y axis when constraining."""
         if enabled:
-            self.CreateProperty("sy", "b").values = [1]
+            self._setProperty("sy", "b", [1])
         else:
-            self.CreateProperty("sy", "b").values = [0]
+            self._setProperty("sy", "b", [0])
 
     def SkipZ(self):
         """Whether or not to skip the z axis when constraining."""
-        sz = self.properties.get("sz")
+        sz = self._property("sz")
         if sz is not None:
             return sz.values[0] >= 1
         return False
@@ -1327,230 +3047,254 @@ class Constraint(CastNode):
     def SetSkipZ(self, enabled):
         """Sets whether or not to skip the z axis when constraining."""
         if enabled:
-            self.CreateProperty("sz", "b").values = [1]
+            self._setProperty("sz", "b", [1])
         else:
-            self.CreateProperty("sz", "b").values = [0]
+            self._setProperty("sz", "b", [0])
+
+    def References(self):
+        """The hashes this constraint links to, as a collection of (property name, hash, node to resolve in)."""
+        return castReferences(self, self.parentNode, ("cb", "tb"))
 
 
 class Material(CastNode):
     """Material contains a collection of slot:file mappings."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Material, self).__init__(0x6C74616D)
 
     def Name(self):
         """The name for this material."""
-        name = self.properties.get("n")
+        name = self._property("n")
         if name is not None:
             return name.values[0]
         return None
 
     def SetName(self, name):
         """Sets the name for this material."""
-        self.CreateProperty("n", "s").values = [name]
+        self._setProperty("n", "s", [name])
 
     def Type(self):
         """The type of this material (pbr)."""
-        tp = self.properties.get("t")
+        tp = self._property("t")
         if tp is not None:
             return tp.values[0]
         return None
 
     def SetType(self, type):
         """Sets the type of this material (pbr)."""
-        self.CreateProperty("t", "s").values = [type]
+        self._setProperty("t", "s", [type])
 
     def Slots(self):
         """A collection of slots for this material."""
         slots = {}
-        for slot in self.properties:
+        for slot, property in self._propertyMap().items():
             if slot != "n" and slot != "t":
-                slots[slot] = self.ChildByHash(self.properties[slot].values[0])
+                slots[slot] = self.ChildByHash(property.values[0])
         return slots
 
     def SetSlot(self, slot, hash):
         """Sets a slot for this material."""
-        self.CreateProperty(slot, "l").values = [hash]
+        self._setProperty(slot, "l", [hash])
 
     def CreateFile(self):
         """Creates a new file reference in this material."""
         return self.CreateChild(File())
 
+    def References(self):
+        """The hashes this material links to, as a collection of (property name, hash, node to resolve in)."""
+        return castReferences(self, self, [x for x in self._propertyMap() if x != "n" and x != "t"])
+
 
 class File(CastNode):
     """An external file reference."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(File, self).__init__(0x656C6966)
 
     def Path(self):
         """The path of this file reference."""
-        path = self.properties.get("p")
+        path = self._property("p")
         if path is not None:
             return path.values[0]
         return None
 
     def SetPath(self, path):
         """Sets the path for this file reference."""
-        self.CreateProperty("p", "s").values = [path]
+        self._setProperty("p", "s", [path])
 
 
 class Color(CastNode):
     """A rgba color value node."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Color, self).__init__(0x726C6F63)
 
     def Name(self):
         """The name for this color value node."""
-        name = self.properties.get("n")
+        name = self._property("n")
         if name is not None:
             return name.values[0]
         return None
 
     def SetName(self, name):
         """Sets the name for this color value node."""
-        self.CreateProperty("n", "s").values = [name]
+        self._setProperty("n", "s", [name])
 
     def ColorSpace(self):
         """The color space for this color value node."""
-        cs = self.properties.get("cs")
+        cs = self._property("cs")
         if cs is not None:
             return cs.values[0]
         return "srgb"
 
     def SetColorSpace(self, value):
         """Sets the color space for this color value node."""
-        self.CreateProperty("cs", "s").values = [value]
+        self._setProperty("cs", "s", [value])
 
     def Rgba(self):
         """The rgba color values for this color value node."""
-        rgba = self.properties.get("rgba")
+        rgba = self._property("rgba")
         if rgba is not None:
             return rgba.values
         return None
 
     def SetRgba(self, rgba):
         """Sets the rgba color values of this color value node."""
-        self.CreateProperty("rgba", "4v").values = list(rgba)
+        self._setProperty("rgba", "4v", list(rgba))
 
 
 class Instance(CastNode):
     """An instance of a cast scene."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Instance, self).__init__(0x74736E69)
 
     def Name(self):
         """The name of this instance."""
-        name = self.properties.get("n")
+        name = self._property("n")
         if name is not None:
             return name.values[0]
         return None
 
     def SetName(self, name):
         """Sets the name of this instance."""
-        self.CreateProperty("n", "s").values = [name]
+        self._setProperty("n", "s", [name])
 
     def ReferenceFile(self):
         """The referenced file for this instance."""
-        reference = self.properties.get("rf")
+        reference = self._property("rf")
         if reference is not None:
             return self.ChildByHash(reference.values[0])
         return None
 
     def SetReferenceFile(self, hash):
         """Sets the referenced file hash for this instance."""
-        self.CreateProperty("rf", "l").values = [hash]
+        self._setProperty("rf", "l", [hash])
+
+    def References(self):
+        """The hashes this instance links to, as a collection of (property name, hash, node to resolve in)."""
+        return castReferences(self, self, ("rf",))
 
     def Position(self):
         """The position of this instance."""
-        position = self.properties.get("p")
+        position = self._property("p")
         if position is not None:
             return position.values
         return None
 
     def SetPosition(self, position):
         """Sets the position of this instance."""
-        self.CreateProperty("p", "3v").values = list(position)
+        self._setProperty("p", "3v", list(position))
 
     def Rotation(self):
         """The rotation of this instance."""
-        rotation = self.properties.get("r")
+        rotation = self._property("r")
         if rotation is not None:
             return rotation.values
         return None
 
     def SetRotation(self, rotation):
         """Sets the rotation of this instance."""
-        self.CreateProperty("r", "4v").values = list(rotation)
+        self._setProperty("r", "4v", list(rotation))
 
     def Scale(self):
         """The scale of this instance."""
-        scale = self.properties.get("s")
+        scale = self._property("s")
         if scale is not None:
             return scale.values
         return None
 
     def SetScale(self, scale):
         """Sets the scale of this instance."""
-        self.CreateProperty("s", "3v").values = list(scale)
+        self._setProperty("s", "3v", list(scale))
 
 
 class Metadata(CastNode):
     """A collection of metadata for a cast scene."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Metadata, self).__init__(0x6174656D)
 
     def Author(self):
         """The author of this scene."""
-        author = self.properties.get("a")
+        author = self._property("a")
         if author is not None:
             return author.values[0]
         return None
 
     def SetAuthor(self, author):
         """Sets the author of this scene."""
-        self.CreateProperty("a", "s").values = [author]
+        self._setProperty("a", "s", [author])
 
     def Software(self):
         """The software that created this scene."""
-        software = self.properties.get("s")
+        software = self._property("s")
         if software is not None:
             return software.values[0]
         return None
 
     def SetSoftware(self, software):
         """Sets the software that created this scene."""
-        self.CreateProperty("s", "s").values = [software]
+        self._setProperty("s", "s", [software])
 
     def UpAxis(self):
         """The up axis for this scene."""
-        up = self.properties.get("up")
+        up = self._property("up")
         if up is not None:
             return up.values[0]
         return None
 
     def SetUpAxis(self, up):
         """Sets the up axis for this scene."""
-        self.CreateProperty("up", "s").values = [up]
+        self._setProperty("up", "s", [up])
 
     def SceneRoot(self):
         """Optional scene root directory."""
-        root = self.properties.get("sr")
+        root = self._property("sr")
         if root is not None:
             return root.values[0]
         return None
 
     def SetSceneRoot(self, root):
         """Sets an optional scene root directory."""
-        self.CreateProperty("sr", "s").values = [root]
+        self._setProperty("sr", "s", [root])
 
 
 class Root(CastNode):
     """A root node."""
 
+    __slots__ = ()
+
     def __init__(self):
         super(Root, self).__init__(0x746F6F72)
 
@@ -1593,13 +3337,24 @@ typeSwitcher = {
     0x6174656D: Metadata,
 }
 
+typeIdentifiers = {v: k for k, v in typeSwitcher.items()}
+
 
 class Cast(object):
     """A cast file that holds a collection of cast nodes."""
-    __slots__ = ("rootNodes")
+    __slots__ = ("rootNodes", "flags", "source")
 
     def __init__(self):
         self.rootNodes = []
+        self.flags = 0
+        # The (memory map, stat) of the file a lazily loaded cast file was mapped from.
+        self.source = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
 
     def Roots(self):
         """Returns the collection of root nodes in this cast file."""
@@ -1611,38 +3366,1017 @@ class Cast(object):
         self.rootNodes.append(root)
         return root
 
+    def DanglingReferences(self):
+        """Resolves every hash link in this cast file in a single pass, returns the (node, property name, hash) links that don't resolve."""
+        dangling = []
+        nodes = list(self.rootNodes)
+
+        while nodes:
+            node = nodes.pop()
+
+            for name, hash, scope in node.References():
+                if scope is None or scope.ChildByHash(hash) is None:
+                    dangling.append((node, name, hash))
+
+            nodes.extend(node.children())
+
+        return dangling
+
     @staticmethod
-    def load(path):
-        """Loads a cast file from the given path."""
+    def load(path, useNumpy=False, lazy=False, includeTypes=None, excludeTypes=None, properties=None, workers=None):
+        """Loads a cast file from the given path or binary file object, optionally decoding numeric arrays with numpy.
+
+        When lazy is set, the file is memory mapped and nodes decode their properties and children on first access.
+        When includeTypes is set, nodes of those types are decoded with everything within them, while other nodes are
+        kept without their properties so the included types are found wherever they sit. excludeTypes skips nodes of
+        those types with everything within them, and properties limits decoding to the properties with those names.
+        When workers is set, independent subtrees of a file on disk are decoded by that many worker processes, see
+        loadParallel for when that's worth it. Workers need concurrent.futures, which Python 2 doesn't have.
+
+        A lazily loaded file stays mapped until the cast file is closed, saving over it writes a new file in its place."""
+        # File objects are read in full, and left open for the caller.
+        if hasattr(path, "read"):
+            return Cast.loads(path.read(), useNumpy, lazy, includeTypes, excludeTypes, properties)
+
+        if workers is not None and workers > 1 and not lazy:
+            return Cast.loadParallel(path, workers, useNumpy, includeTypes, excludeTypes, properties)
+
         try:
             file = open(path, "rb")
         except IOError:
             raise Exception("Could not open file for reading: %s\n" % path)
 
-        header = struct.unpack("IIII", file.read(0x10))
-        if header[0] != 0x74736163:
-            raise Exception("Invalid cast file magic")
+        # Read the whole file once, then walk it by offset.
+        with file:
+            if lazy:
+                buffer = castMapFile(file)
+                stat = os.fstat(file.fileno())
+            else:
+                buffer = file.read()
 
-        cast = Cast()
-        cast.rootNodes = [None] * header[2]
+        cast = Cast.loads(buffer, useNumpy, lazy, includeTypes, excludeTypes, properties)
 
-        for i in range(header[2]):
-            cast.rootNodes[i] = CastNode.load(file)
+        if lazy and isinstance(buffer, mmap.mmap):
+            cast.source = (buffer, stat)
 
         return cast
 
-    def save(self, path):
-        """Saves the cast file to the given path."""
-        try:
-            file = open(path, "wb")
-        except IOError:
-            raise Exception("Could not create file for writing: %s\n" % path)
+    @staticmethod
+    def loads(data, useNumpy=False, lazy=False, includeTypes=None, excludeTypes=None, properties=None):
+        """Loads a cast file from the given bytes, or any buffer such as a memoryview, see load for the options.
+
+        The data is referenced, not copied, so it must not be modified while the cast file is in use."""
+        if isinstance(data, (bytes, mmap.mmap)):
+            buffer = data
+        elif castPython2:
+            buffer = castBytes(memoryview(data))
+        else:
+            buffer = memoryview(data)
+
+            if buffer.ndim != 1 or buffer.format != "B":
+                buffer = buffer.cast("B")
+
+        header = castFileHeader.unpack_from(buffer, 0)
+        if header[0] != 0x74736163:
+            raise Exception("Invalid cast file magic")
+
+        if includeTypes is not None or excludeTypes is not None or properties is not None:
+            filter = CastFilter(includeTypes, excludeTypes, properties)
+        else:
+            filter = None
+
+        cast = Cast()
+        cast.rootNodes = [None] * header[2]
+        cast.flags = header[3]
+
+        offset = 0x10
+
+        for i in range(header[2]):
+            if lazy:
+                cast.rootNodes[i] = \
+                    CastNode.loadLazy(buffer, offset, useNumpy, filter, header[3])
+                offset += castNodeHeader.unpack_from(buffer, offset)[1]
+            else:
+                cast.rootNodes[i], offset = \
+                    CastNode.loadBuffer(buffer, offset, useNumpy, filter)
+
+        return cast
+
+    @staticmethod
+    def loadParallel(path, workers, useNumpy=False, includeTypes=None, excludeTypes=None, properties=None):
+        """Loads a cast file from the given path, decoding independent subtrees in a pool of worker processes.
+
+        Files without payloads stored through codecs, or with less than castParallelLoadSize for each worker, are
+        loaded serially."""
+        if concurrent is None:
+            raise Exception("Loading with workers requires concurrent.futures")
+
+        try:
+            file = open(path, "rb")
+        except IOError:
+            raise Exception("Could not open file for reading: %s\n" % path)
+
+        # The file is read, not mapped, so the nodes don't reference a file that may be saved over.
+        with file:
+            buffer = file.read()
+
+        header = castFileHeader.unpack_from(buffer, 0)
+        if header[0] != 0x74736163:
+            raise Exception("Invalid cast file magic")
+
+        # Nodes decoded by workers cost about as much to unpickle as to parse, so only payloads stored through codecs,
+        # which workers decompress, make up for it, and only when there's enough of the file for each worker.
+        if not header[3] & castFileCodecs or len(buffer) < castParallelLoadSize * workers:
+            return Cast.loads(buffer, useNumpy, False, includeTypes, excludeTypes, properties)
+
+        if includeTypes is not None or excludeTypes is not None or properties is not None:
+            filter = CastFilter(includeTypes, excludeTypes, properties)
+        else:
+            filter = None
+
+        cast = Cast()
+        cast.rootNodes = [None] * header[2]
+        cast.flags = header[3]
+
+        # Nodes larger than a fair share of the file are split into their children, so the work can be balanced.
+        share = max(len(buffer) // (workers * 4), 1)
+
+        # Each subtree is [collection it belongs in, index in the collection, offset, size, filter].
+        subtrees = []
+        splits = []
+        nodes = []
+
+        offset = 0x10
+
+        for i in range(header[2]):
+            size = castNodeHeader.unpack_from(buffer, offset)[1]
+            nodes.append([cast.rootNodes, i, offset, size, filter])
+            offset += size
+
+        nodes.reverse()
+
+        while nodes:
+            subtree = nodes.pop()
+            collection, index, offset, size, subtreeFilter = subtree
+
+            if size <= share or castNodeHeader.unpack_from(buffer, offset)[4] == 0:
+                subtrees.append(subtree)
+                continue
+
+            # The node itself is decoded here, and its children are queued in order.
+            node = CastNode.loadLazy(buffer, offset, useNumpy, subtreeFilter, header[3])
+            node._loadProperties()
+
+            if subtreeFilter is not None:
+                subtreeFilter = subtreeFilter.childFilter(node.identifier)
+
+            children = []
+
+            offset += 0x18
+
+            for i in range(castNodeHeader.unpack_from(buffer, subtree[2])[3]):
+                offset = CastProperty.skipBuffer(buffer, offset)
+
+            for i in range(castNodeHeader.unpack_from(buffer, subtree[2])[4]):
+                size = castNodeHeader.unpack_from(buffer, offset)[1]
+
+                if subtreeFilter is None or subtreeFilter.includesNode(buffer, offset):
+                    children.append([None, len(children), offset, size, subtreeFilter])
+
+                offset += size
+
+            node._childNodes = [None] * len(children) or castEmptyChildNodes
+            node._source = None
+
+            for child in children:
+                child[0] = node._childNodes
+
+            collection[index] = node
+            splits.append(node)
+            nodes.extend(reversed(children))
+
+        # Neighbouring subtrees are batched up to a fair share, to limit the number of tasks.
+        batches = []
+        batch = []
+        batchSize = 0
+
+        for subtree in subtrees:
+            batch.append(subtree)
+            batchSize += subtree[3]
+
+            if batchSize >= share:
+                batches.append(batch)
+                batch = []
+                batchSize = 0
+
+        if batch:
+            batches.append(batch)
+
+        if len(batches) > 1:
+            with concurrent.futures.ProcessPoolExecutor(workers,
+                                                        initializer=castLoadWorkerInit,
+                                                        initargs=(path, useNumpy)) as pool:
+                results = pool.map(castLoadWorkerSubtrees, [[(x[2], x[4]) for x in batch] for batch in batches])
+
+                for batch, result in zip(batches, results):
+                    castLoadWorkerAttach(result, buffer)
+
+                    for subtree, node in zip(batch, result):
+                        subtree[0][subtree[1]] = node
+        else:
+            for subtree in subtrees:
+                subtree[0][subtree[1]] = \
+                    CastNode.loadBuffer(buffer, subtree[2], useNumpy, subtree[4])[0]
+
+        for node in splits:
+            for child in node._childNodes:
+                child.parentNode = node
+
+        return cast
+
+    @staticmethod
+    def openIndexed(path, useNumpy=False):
+        """Opens a cast file for random access, using or creating its .castidx index."""
+        return CastIndex(path, useNumpy)
+
+    def close(self):
+        """Releases the file a lazily loaded cast file is mapped from.
+
+        Payloads that were already decoded are copied, while properties and children that were never accessed can no
+        longer be loaded, and raise an exception when they're used."""
+        self._releaseSource(None)
+
+    def _releaseSource(self, buffer):
+        """Closes the mapped file, moving the lazy nodes that reference it to the given buffer, or detaching them."""
+        if self.source is None:
+            return
 
-        file.write(struct.pack("IIII",
-                               0x74736163,
-                               0x1,
-                               len(self.rootNodes),
-                               0))
+        # Only the nodes that were accessed are walked, the rest of the file is never read.
+        nodes = list(self.rootNodes)
+
+        while nodes:
+            node = nodes.pop()
+
+            # Packed properties are copied from the file when they're loaded.
+            if node._properties is not None and node._properties.__class__ is not bytes:
+                for property in node._properties.values():
+                    property.detach()
+
+            if node._childNodes is not None:
+                nodes.extend(node._childNodes)
+
+            if node._source is not None:
+                node._source = None if buffer is None else (buffer,) + node._source[1:]
+
+        try:
+            self.source[0].close()
+        except BufferError:
+            raise Exception("Values that reference the mapped file are still in use")
+
+        self.source = None
+
+    def mapsFile(self, path):
+        """Whether or not the file at the given path is the file this cast file is lazily mapped from."""
+        if self.source is None:
+            return False
+
+        try:
+            return os.path.samestat(self.source[1], os.stat(path))
+        except OSError:
+            return False
+
+    def save(self, path, workers=None, background=False, fsync=False, codecs=None):
+        """Saves the cast file to the given path or binary file object, file objects are left open for the caller.
+
+        When workers is set, independent subtrees are serialized by that many threads, which needs concurrent.futures
+        that Python 2 doesn't have. When background is set, data is written to the file by a background thread while
+        serializing continues. When fsync is set, the file is flushed to disk before returning. When codecs is set to a
+        CastCodecPolicy, or the name of a codec, property payloads are stored through codecs."""
+        if hasattr(path, "write"):
+            file = path
+        elif self.mapsFile(path):
+            return castSaveReplacing(self, path, lambda file: self.save(file, workers, background, fsync, codecs))
+        else:
+            try:
+                file = open(path, "wb")
+            except IOError:
+                raise Exception("Could not create file for writing: %s\n" % path)
+
+            with file:
+                return self.save(file, workers, background, fsync, codecs)
+
+        codecs = castCodecPolicy(codecs)
+
+        if background:
+            with CastBackgroundWriter(file) as writer:
+                self.save(writer, workers, codecs=codecs)
+        elif workers is not None and workers > 1:
+            self.saveParallel(file, workers, codecs)
+        else:
+            file.write(castFileHeader.pack(0x74736163,
+                                           0x1,
+                                           len(self.rootNodes),
+                                           self.saveFlags(codecs)))
+
+            for rootNode in self.rootNodes:
+                rootNode.save(file, codecs=codecs)
+
+        if fsync:
+            file.flush()
+            os.fsync(file.fileno())
+
+    def saveParallel(self, path, workers, codecs=None):
+        """Saves the cast file to the given path or binary file object, serializing independent subtrees in a pool of threads."""
+        if concurrent is None:
+            raise Exception("Saving with workers requires concurrent.futures")
+
+        if hasattr(path, "write"):
+            file = path
+        elif self.mapsFile(path):
+            return castSaveReplacing(self, path, lambda file: self.saveParallel(file, workers, codecs))
+        else:
+            try:
+                file = open(path, "wb")
+            except IOError:
+                raise Exception("Could not create file for writing: %s\n" % path)
+
+            with file:
+                return self.saveParallel(file, workers, codecs)
+
+        codecs = castCodecPolicy(codecs)
+        lengths = {}
 
         for rootNode in self.rootNodes:
-            rootNode.save(file)
+            rootNode.length(lengths, codecs)
+
+        # Nodes larger than a fair share of the file are split into their children, so the work can be balanced.
+        share = max(sum(lengths[x] for x in self.rootNodes) // (workers * 4), 1)
+
+        # Each piece, in file order, is either a subtree to serialize or the serialized header and properties of a split node.
+        pieces = []
+        nodes = list(reversed(self.rootNodes))
+
+        while nodes:
+            node = nodes.pop()
+
+            # Lazy nodes that were never accessed are written verbatim, so there's no work to split.
+            if node._verbatim(codecs):
+                pieces.append(node)
+                continue
+
+            if lengths[node] <= share or not node.children():
+                pieces.append(node)
+                continue
+
+            childNodes = node.children()
+            properties = node.properties
+
+            # Children of a lazy node that was never accessed haven't been measured yet.
+            for childNode in childNodes:
+                if childNode not in lengths:
+                    childNode.length(lengths, codecs)
+
+            blob = CastBlob()
+            buffer = bytearray(castNodeHeader.pack(node.identifier,
+                                                   lengths[node],
+                                                   node._hash,
+                                                   len(properties),
+                                                   len(childNodes)))
+
+            for property in properties.values():
+                property.save(blob, buffer, lengths.get(property))
+
+            blob.write(buffer)
+
+            pieces.append(blob.chunks)
+            nodes.extend(reversed(childNodes))
+
+        file.write(castFileHeader.pack(0x74736163,
+                                       0x1,
+                                       len(self.rootNodes),
+                                       self.saveFlags(codecs)))
+
+        # Only a few serialized subtrees are kept ahead of the file, to bound memory use.
+        pending = collections.deque()
+
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            for piece in pieces:
+                if isinstance(piece, CastNode):
+                    pending.append(pool.submit(castSaveSubtree, piece, lengths, codecs))
+                else:
+                    pending.append(piece)
+
+                while len(pending) > workers * 2:
+                    castWriteChunks(file, pending.popleft())
+
+            while pending:
+                castWriteChunks(file, pending.popleft())
+
+    def saveFlags(self, codecs=None):
+        """Returns the flags for the file header when saving with the given codec policy."""
+        # Lazy nodes are only written verbatim without a codec policy, when their payloads aren't stored through one.
+        if codecs is not None:
+            return castFileCodecs
+        return 0
+
+    def dumps(self, codecs=None):
+        """Saves the cast file to bytes, see save for the codec policy."""
+        file = io.BytesIO()
+        self.save(file, codecs=codecs)
+
+        return file.getvalue()
+
+
+def castSaveReplacing(cast, path, save):
+    """Saves a cast file over the file it's lazily mapped from, untouched nodes are still copied from the mapped file.
+
+    The file is written next to the original, then replaces it, as truncating a mapped file invalidates the mapping.
+    Windows can't replace a mapped file, so the file is copied to memory and the mapping is released first."""
+    if os.name == "nt":
+        cast._releaseSource(cast.source[0][:])
+
+        try:
+            file = open(path, "wb")
+        except IOError:
+            raise Exception("Could not create file for writing: %s\n" % path)
+
+        with file:
+            return save(file)
+
+    try:
+        descriptor, temporary = tempfile.mkstemp(".cast", dir=os.path.dirname(os.path.abspath(path)))
+    except (IOError, OSError):
+        raise Exception("Could not create file for writing: %s\n" % path)
+
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            save(file)
+
+        shutil.copymode(path, temporary)
+        castReplace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+class CastBlob(object):
+    """Collects the data written by a serializer, so it can be written to a file later."""
+    __slots__ = ("chunks")
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        # The serializer reuses its buffer, so that's copied, other data is referenced.
+        if isinstance(data, bytearray):
+            data = bytes(data)
+
+        self.chunks.append(data)
+
+
+class CastBackgroundWriter(object):
+    """Writes data to a file from a background thread through a bounded queue, so serializing overlaps with writing."""
+    __slots__ = ("file", "queue", "thread", "error")
+
+    def __init__(self, file, queueSize=castWriteQueueSize):
+        self.file = file
+        self.queue = queue.Queue(queueSize)
+        self.error = None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def run(self):
+        """Writes queued data until the writer is closed, keeping the first error for the serializing thread."""
+        while True:
+            data = self.queue.get()
+
+            if data is None:
+                return
+            elif self.error is None:
+                try:
+                    self.file.write(data)
+                except Exception as e:
+                    self.error = e
+
+    def write(self, data):
+        """Queues data to be written, waiting while the queue is full."""
+        if self.error is not None:
+            raise self.error
+
+        # The serializer reuses its buffer, so that's copied, other data is referenced.
+        if isinstance(data, bytearray):
+            data = bytes(data)
+
+        self.queue.put(data)
+
+    def close(self):
+        """Waits for all queued data to be written."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+
+def castSaveSubtree(node, lengths, codecs):
+    """Serializes a subtree for a parallel save with the codec policy it was measured with, returns the chunks."""
+    blob = CastBlob()
+    node.save(blob, lengths, codecs)
+
+    return blob.chunks
+
+
+def castWriteChunks(file, chunks):
+    """Writes the chunks of a parallel save, waiting for them to be serialized if they're pending."""
+    if isinstance(chunks, concurrent.futures.Future):
+        chunks = chunks.result()
+
+    for chunk in chunks:
+        file.write(chunk)
+
+
+# The file buffer, and load options, of a parallel load worker process.
+castLoadWorker = None
+
+
+def castLoadWorkerInit(path, useNumpy):
+    """Maps the file being loaded in a parallel load worker process."""
+    global castLoadWorker
+
+    with open(path, "rb") as file:
+        buffer = castMapFile(file)
+
+    castLoadWorker = (buffer, useNumpy)
+
+
+def castLoadWorkerSubtrees(subtrees):
+    """Decodes the subtrees at the given (offset, filter) in a parallel load worker process."""
+    buffer, useNumpy = castLoadWorker
+
+    result = [CastNode.loadBuffer(buffer, offset, useNumpy, filter)[0] for offset, filter in subtrees]
+
+    # Large payloads are sent back as their (offset, size) in the file, instead of being copied between processes.
+    # Which nodes were skipped only depends on the excluded types, which every filter of a load shares.
+    filter = subtrees[0][1] if subtrees else None
+    nodes = list(zip(result, [offset for offset, x in subtrees]))
+
+    while nodes:
+        node, offset = nodes.pop()
+        header = castNodeHeader.unpack_from(buffer, offset)
+        offset += 0x18
+
+        for i in range(header[3]):
+            propertyHeader = castPropertyHeader.unpack_from(buffer, offset)
+            end = CastProperty.skipBuffer(buffer, offset)
+
+            nameSize = propertyHeader[1] & ~castPropertyCodec
+            name = castBytes(buffer[offset + 0x8:offset + 0x8 + nameSize]).decode("utf-8")
+            property = node._properties.get(name) if node._properties.__class__ is not bytes else None
+
+            if property is not None and isinstance(property._raw, memoryview):
+                size = property._raw.nbytes
+                property._raw = (end - size, size)
+
+            offset = end
+
+        children = iter(node._childNodes)
+
+        for i in range(header[4]):
+            if filter is None or filter.includesNode(buffer, offset):
+                nodes.append((next(children), offset))
+
+            offset += castNodeHeader.unpack_from(buffer, offset)[1]
+
+    return result
+
+
+def castLoadWorkerAttach(nodes, buffer):
+    """Replaces the large payload locations sent back by a parallel load worker process with views of the file."""
+    nodes = list(nodes)
+
+    while nodes:
+        node = nodes.pop()
+
+        # Packed properties never hold large payloads.
+        if node._properties.__class__ is not bytes:
+            for property in node._properties.values():
+                if isinstance(property._raw, tuple):
+                    offset, size = property._raw
+                    property._raw = memoryview(buffer)[offset:offset + size]
+
+        nodes.extend(node._childNodes)
+
+
+class CastWriter(object):
+    """Writes a cast file node by node, without building the node tree in memory.
+
+    When codecs is set to a CastCodecPolicy, or the name of a codec, property payloads given as collections are
+    stored through codecs, payloads given as an iterator of chunks are always stored as is."""
+    __slots__ = ("file", "nodes", "rootCount", "codecs")
+
+    def __init__(self, path, codecs=None):
+        try:
+            self.file = open(path, "wb")
+        except IOError:
+            raise Exception("Could not create file for writing: %s\n" % path)
+
+        # Each open node is [offset, identifier, hash, propertyCount, childCount].
+        self.nodes = []
+        self.rootCount = 0
+        self.codecs = castCodecPolicy(codecs)
+
+        self.file.write(castFileHeader.pack(0x74736163, 0x1, 0, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.close()
+        else:
+            self.file.close()
+
+    def beginNode(self, identifier, hash=None):
+        """Begins a new node, as a child of the current node, returns the hash of the node.
+
+        The identifier may either be a cast id, or a node class such as Mesh."""
+        if not isinstance(identifier, int):
+            identifier = typeIdentifiers[identifier]
+        if hash is None:
+            hash = castNextHash()
+
+        if self.nodes:
+            self.nodes[-1][4] += 1
+        elif identifier == 0x746F6F72:
+            self.rootCount += 1
+        else:
+            raise Exception("Nodes must be written in a root node")
+
+        self.nodes.append([self.file.tell(), identifier, hash, 0, 0])
+        self.file.write(castNodeHeader.pack(identifier, 0, hash, 0, 0))
+
+        return hash
+
+    def addProperty(self, name, type, values):
+        """Writes a property to the current node.
+
+        Values may be a string, a flat collection of values, or an iterator of flat collections
+        which are written one chunk at a time."""
+        if not self.nodes:
+            raise Exception("Properties must be written in a node")
+
+        node = self.nodes[-1]
+
+        if node[4] > 0:
+            raise Exception("Properties must be written before child nodes")
+
+        node[3] += 1
+
+        propertyType = castPropertyType(type)
+        identifier = propertyType.identifier.encode("utf-8")
+        name = name.encode("utf-8")
+
+        if propertyType.size == 0 and propertyType.fmt == "s":
+            self.file.write(castPropertyHeader.pack(identifier, len(name), 1))
+            self.file.write(name)
+            self.file.write(values.encode("utf-8"))
+            self.file.write(b'\x00')
+        elif hasattr(values, "__len__") and self.codecs is not None:
+            property = CastProperty(name=name.decode("utf-8"), type=type)
+            property.values = values
+            property.save(self.file, None, property.encode(self.codecs))
+        elif hasattr(values, "__len__"):
+            self.file.write(castPropertyHeader.pack(identifier,
+                                                    len(name),
+                                                    castArrayLength(propertyType, values)))
+            self.file.write(name)
+
+            for chunk in castPayloadChunks(propertyType, values):
+                self.file.write(chunk)
+        else:
+            offset = self.file.tell()
+            count = 0
+
+            self.file.write(castPropertyHeader.pack(identifier, len(name), 0))
+            self.file.write(name)
+
+            for chunk in values:
+                count += castArrayLength(propertyType, chunk)
+
+                for data in castPayloadChunks(propertyType, chunk):
+                    self.file.write(data)
+
+            self.patch(offset, castPropertyHeader.pack(identifier,
+                                                       len(name),
+                                                       count))
+
+    def addNode(self, node):
+        """Writes an existing node, and all of its children, as a child of the current node."""
+        if self.nodes:
+            self.nodes[-1][4] += 1
+        elif node.identifier == 0x746F6F72:
+            self.rootCount += 1
+        else:
+            raise Exception("Nodes must be written in a root node")
+
+        node.save(self.file)
+
+    def endNode(self):
+        """Ends the current node, writing its final size, property, and child counts."""
+        if not self.nodes:
+            raise Exception("There is no node to end")
+
+        offset, identifier, hash, propertyCount, childCount = self.nodes.pop()
+
+        self.patch(offset, castNodeHeader.pack(identifier,
+                                               self.file.tell() - offset,
+                                               hash,
+                                               propertyCount,
+                                               childCount))
+
+    def close(self):
+        """Finishes the file, writing the final root node count."""
+        if self.nodes:
+            raise Exception("All nodes must be ended before closing")
+
+        self.patch(0, castFileHeader.pack(0x74736163, 0x1, self.rootCount,
+                                          castFileCodecs if self.codecs is not None else 0))
+        self.file.close()
+
+    def patch(self, offset, data):
+        """Overwrites previously written data at offset."""
+        end = self.file.tell()
+
+        self.file.seek(offset)
+        self.file.write(data)
+        self.file.seek(end)
+
+
+class CastEvent(object):
+    """A single event produced while scanning a cast file with castIterEvents."""
+    __slots__ = ("kind", "depth", "identifier", "hash", "offset",
+                 "name", "arrayLength", "buffer", "skipped")
+
+    def __init__(self, kind, depth, identifier, hash, offset, buffer):
+        self.kind = kind
+        self.depth = depth
+        self.identifier = identifier
+        self.hash = hash
+        self.offset = offset
+        self.name = None
+        self.arrayLength = 0
+        self.buffer = buffer
+        self.skipped = False
+
+    def skip(self):
+        """Skips the children and properties of the node that was entered, the exit event is still produced."""
+        self.skipped = True
+
+    def values(self, useNumpy=False):
+        """Decodes the values of the property for this event."""
+        property = CastProperty()
+        property.loadBuffer(self.buffer, self.offset, useNumpy)
+        return property.values
+
+
+def castIterEvents(path):
+    """Scans a cast file, yielding "enter", "property", and "exit" events without creating nodes.
+
+    Node events carry the node identifier and hash, property events carry the property type
+    identifier, name, array length, and the hash of the owning node. Property values are only
+    decoded when requested with CastEvent.values()."""
+    try:
+        file = open(path, "rb")
+    except IOError:
+        raise Exception("Could not open file for reading: %s\n" % path)
+
+    with file:
+        buffer = castMapFile(file)
+
+    return castIterBufferEvents(buffer)
+
+
+def castIterBufferEvents(buffer):
+    """Scans a cast file in the given buffer, yielding events like castIterEvents."""
+    header = castFileHeader.unpack_from(buffer, 0)
+    if header[0] != 0x74736163:
+        raise Exception("Invalid cast file magic")
+
+    offset = 0x10
+
+    # The remaining children for each open node, and the open nodes themselves.
+    remaining = [header[2]]
+    nodes = []
+
+    while remaining:
+        if remaining[-1] == 0:
+            remaining.pop()
+
+            if nodes:
+                node, end = nodes.pop()
+                offset = end
+
+                yield CastEvent("exit", len(nodes), node.identifier,
+                                node.hash, node.offset, buffer)
+            continue
+
+        remaining[-1] -= 1
+
+        header = castNodeHeader.unpack_from(buffer, offset)
+        node = CastEvent("enter", len(nodes),
+                         header[0], header[2], offset, buffer)
+
+        yield node
+
+        end = offset + header[1]
+
+        if node.skipped:
+            offset = end
+
+            yield CastEvent("exit", len(nodes), node.identifier,
+                            node.hash, node.offset, buffer)
+            continue
+
+        offset += 0x18
+
+        for i in range(header[3]):
+            propertyHeader = castPropertyHeader.unpack_from(buffer, offset)
+
+            property = CastEvent("property", len(nodes) + 1,
+                                 propertyHeader[0].decode("utf-8").strip('\0'),
+                                 header[2], offset, buffer)
+            property.name = castBytes(
+                buffer[offset + 0x8:offset + 0x8 + (propertyHeader[1] & ~castPropertyCodec)]).decode("utf-8")
+            property.arrayLength = propertyHeader[2]
+
+            yield property
+
+            offset = CastProperty.skipBuffer(buffer, offset)
+
+        remaining.append(header[4])
+        nodes.append((node, end))
+
+
+class CastIndex(object):
+    """An index of every node in a cast file, persisted next to it in a .castidx file for random access."""
+    __slots__ = ("buffer", "useNumpy", "entries", "hashes", "types", "names", "nodes")
+
+    def __init__(self, path, useNumpy=False):
+        try:
+            file = open(path, "rb")
+        except IOError:
+            raise Exception("Could not open file for reading: %s\n" % path)
+
+        with file:
+            self.buffer = castMapFile(file)
+            stat = os.fstat(file.fileno())
+
+        self.useNumpy = useNumpy
+        self.nodes = {}
+
+        indexPath = os.path.splitext(path)[0] + ".castidx"
+
+        # The index is only valid for the exact file it was built from.
+        self.entries = CastIndex.loadEntries(indexPath, stat)
+
+        if self.entries is None:
+            self.entries = CastIndex.buildEntries(self.buffer)
+
+            try:
+                CastIndex.saveEntries(indexPath, stat, self.entries)
+            except (IOError, OSError):
+                pass
+
+        self.hashes = {}
+        self.types = {}
+        self.names = {}
+
+        for i, entry in enumerate(self.entries):
+            self.hashes.setdefault(entry[3], i)
+            self.types.setdefault(entry[2], []).append(i)
+
+            if entry[5] is not None:
+                self.names.setdefault(entry[5], []).append(i)
+
+    @staticmethod
+    def buildEntries(buffer):
+        """Builds the index entries (offset, size, identifier, hash, parent, name) for the file in the given buffer."""
+        entries = []
+        parents = [-1]
+
+        for event in castIterBufferEvents(buffer):
+            if event.kind == "enter":
+                size = castNodeHeader.unpack_from(buffer, event.offset)[1]
+
+                parents.append(len(entries))
+                entries.append([event.offset, size, event.identifier,
+                                event.hash, parents[-2], None])
+            elif event.kind == "exit":
+                parents.pop()
+            elif event.name in ("n", "nn") and event.identifier == "s":
+                entries[parents[-1]][5] = event.values()[0]
+
+        return [tuple(x) for x in entries]
+
+    @staticmethod
+    def loadEntries(path, stat):
+        """Loads the index entries from the given index file, if it matches the stat of the cast file."""
+        try:
+            with open(path, "rb") as file:
+                buffer = file.read()
+        except (IOError, OSError):
+            return None
+
+        if len(buffer) < castIndexHeader.size:
+            return None
+
+        header = castIndexHeader.unpack_from(buffer, 0)
+
+        if header[0] != 0x78646963 or header[1] != 0x1 or \
+                header[2] != stat.st_size or header[3] != castModifiedTime(stat):
+            return None
+
+        entries = [None] * header[4]
+        offset = castIndexHeader.size
+
+        for i in range(header[4]):
+            entry = castIndexEntry.unpack_from(buffer, offset)
+            offset += castIndexEntry.size
+
+            if entry[5] > 0:
+                name = buffer[offset:offset + entry[5]].decode("utf-8")
+            else:
+                name = None
+            offset += entry[5]
+
+            entries[i] = entry[0:5] + (name,)
+
+        return entries
+
+    @staticmethod
+    def saveEntries(path, stat, entries):
+        """Saves the index entries to the given index file, tagged with the stat of the cast file."""
+        with open(path, "wb") as file:
+            file.write(castIndexHeader.pack(0x78646963, 0x1,
+                                            stat.st_size,
+                                            castModifiedTime(stat),
+                                            len(entries)))
+
+            for entry in entries:
+                name = (entry[5] or "").encode("utf-8")
+
+                file.write(castIndexEntry.pack(entry[0], entry[1], entry[2],
+                                               entry[3], entry[4], len(name)))
+                file.write(name)
+
+    def Node(self, index):
+        """Loads the node for the given index entry, along with its parent nodes."""
+        # Load any parents which haven't been loaded yet, outermost first.
+        missing = []
+
+        while index >= 0 and index not in self.nodes:
+            missing.append(index)
+            index = self.entries[index][4]
+
+        for index in reversed(missing):
+            entry = self.entries[index]
+            node = CastNode.loadLazy(self.buffer, entry[0], self.useNumpy, None,
+                                     castFileHeader.unpack_from(self.buffer, 0)[3])
+
+            if entry[4] >= 0:
+                node.parentNode = self.nodes[entry[4]]
+
+            self.nodes[index] = node
+
+        return self.nodes.get(index)
+
+    def NodeByHash(self, hash):
+        """Finds a node by the given hash."""
+        index = self.hashes.get(hash)
+        if index is not None:
+            return self.Node(index)
+        return None
+
+    def NodesOfType(self, pType):
+        """Finds all nodes that match the given type."""
+        return [self.Node(x) for x in self.types.get(typeIdentifiers[pType], [])]
+
+    def NodesByName(self, name, pType=None):
+        """Finds all nodes with the given name, optionally matching the given type.
+
+        Curves and curve mode overrides are indexed by the name of the node they animate."""
+        indices = self.names.get(name, [])
+
+        if pType is not None:
+            identifier = typeIdentifiers[pType]
+            indices = [x for x in indices if self.entries[x][2] == identifier]
+
+        return [self.Node(x) for x in indices]